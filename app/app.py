@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import whisper
 import ffmpeg
 import os
 import subprocess
 
+from subtitle_writer import SubtitleWriter
+
 def select_video():
     root = tk.Tk()
     root.withdraw()
@@ -14,29 +15,19 @@ def select_video():
     return video_path
 
 def generate_hebrew_subs(video_path):
+    # Imported here so the window opens without waiting for torch
+    import whisper
     # Load Whisper model (can use 'small' or 'medium' for better accuracy)
     model = whisper.load_model("small")
     # Transcribe with translation to Hebrew
     result = model.transcribe(video_path, task="translate", language="he")
     # Prepare SRT file
     srt_path = os.path.splitext(video_path)[0] + "_he.srt"
-    with open(srt_path, "w", encoding="utf-8") as f:
-        for i, seg in enumerate(result['segments'], 1):
-            start = seg['start']
-            end = seg['end']
-            text = seg['text'].strip()
-            f.write(f"{i}\n")
-            f.write(f"{format_time(start)} --> {format_time(end)}\n")
-            f.write(f"{text}\n\n")
+    with SubtitleWriter(srt_path) as writer:
+        for seg in result['segments']:
+            writer.write(seg['start'], seg['end'], seg['text'])
     return srt_path
 
-def format_time(seconds):
-    millis = int((seconds - int(seconds)) * 1000)
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    return f"{h:02}:{m:02}:{s:02},{millis:03}"
-
 def burn_subtitles(video_path, srt_path):
     output_path = os.path.splitext(video_path)[0] + "_hebrew_burned.mp4"
     # Use FFmpeg to burn in the Hebrew subtitles
@@ -1,79 +1,253 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
-import threading
-import whisper
+from tkinter import filedialog, ttk
 import os
-import subprocess
-import pathlib
+import queue
+import sys
+import threading
+from collections import deque
+from types import SimpleNamespace
+
 import certifi
+
+from burn import DEFAULT_PROFILE, burn_subtitles_multi
+from media import output_extension
+from subtitle_writer import SubtitleWriter
+
+try:
+    # Optional: lets files be dropped onto the window
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+except ImportError:
+    TkinterDnD = None
+
 os.environ['SSL_CERT_FILE'] = certifi.where()
 
-def format_time(seconds):
-    millis = int((seconds - int(seconds)) * 1000)
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    return f"{h:02}:{m:02}:{s:02},{millis:03}"
-
-def generate_hebrew_subs(video_path, status_callback):
-    # model = whisper.load_model("small")  # You can use 'medium' for better accuracy
-    model = whisper.load_model("/Users/ikoishman/.cache/whisper/models/small")
-    print("Model loaded!")
-    status_callback("Transcribing and translating audio to Hebrew...")
-    result = model.transcribe(video_path, task="translate", language="he")
-    srt_path = os.path.splitext(video_path)[0] + "_he.srt"
-    with open(srt_path, "w", encoding="utf-8") as f:
-        for i, seg in enumerate(result['segments'], 1):
-            start = seg['start']
-            end = seg['end']
-            text = seg['text'].strip()
-            f.write(f"{i}\n")
-            f.write(f"{format_time(start)} --> {format_time(end)}\n")
-            f.write(f"{text}\n\n")
-    status_callback(f"Subtitles generated and saved to:\n{srt_path}")
-    return srt_path
-
-def burn_subtitles(video_path, srt_path, status_callback):
-    suffix = pathlib.Path(video_path).suffix
-    output_path = os.path.splitext(video_path)[0] + f"_hebrew_burned{suffix}"
-    status_callback("Burning subtitles into video. This may take a few minutes...")
-    cmd = [
-        "ffmpeg",
-        "-y",  # Overwrite output without asking
-        "-i", video_path,
-        "-vf", f"subtitles={srt_path}:force_style='FontName=Arial'",
-        "-c:a", "copy",
-        output_path
-    ]
+# "small" downloads the model; 'medium' gives better accuracy
+WHISPER_MODEL = os.environ.get("SUBS_WHISPER_MODEL", "/Users/ikoishman/.cache/whisper/models/small")
+# Part of a file's progress bar that is transcription; burning is the rest
+TRANSCRIBE_SHARE = 0.7
+POLL_MS = 100
+
+
+class Cancelled(Exception):
+    pass
+
+
+class _WhisperProgress:
+    """
+    Stands in for the tqdm bar whisper.transcribe advances after every decoded window (in mel frames),
+    so progress arrives per segment and a cancel takes effect between windows.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        self.total = 0
+        self.n = 0
+
+    def __call__(self, total=None, **kwargs):
+        self.total, self.n = total or 0, 0
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n):
+        self.n += n
+        self.report(min(1.0, self.n / self.total) if self.total else 0.0)
+
+
+def generate_hebrew_subs(model, video_path, report):
+    """Write <video>_he.srt; report(fraction of the audio done) after every segment. Returns (srt, duration)."""
+    # Imported here so the window opens without waiting for torch
+    import whisper
+    audio = whisper.load_audio(video_path)
+    transcribe_module = sys.modules["whisper.transcribe"]
+    tqdm_module = transcribe_module.tqdm
+    transcribe_module.tqdm = SimpleNamespace(tqdm=_WhisperProgress(report))
     try:
-        subprocess.run(cmd, check=True)
-        status_callback(f"Done!\nOutput video with Hebrew subtitles:\n{output_path}")
-    except Exception as e:
-        status_callback(f"FFmpeg error:\n{e}")
+        result = model.transcribe(audio, task="translate", language="he", verbose=False)
+    finally:
+        transcribe_module.tqdm = tqdm_module
+    srt_path = os.path.splitext(video_path)[0] + "_he.srt"
+    with SubtitleWriter(srt_path) as writer:
+        for seg in result['segments']:
+            writer.write(seg['start'], seg['end'], seg['text'])
+    return srt_path, len(audio) / whisper.audio.SAMPLE_RATE
 
-def process_video(video_path, status_callback):
+
+def burn_subtitles(video_path, srt_path, duration, report):
+    # The video is re-encoded to H.264 and the audio copied as it is, so the container follows the audio codec
+    output_path = os.path.splitext(video_path)[0] + "_hebrew_burned" + output_extension(video_path)
     try:
-        srt_path = generate_hebrew_subs(video_path, status_callback)
-        burn_subtitles(video_path, srt_path, status_callback)
-    except Exception as e:
-        status_callback(f"Error: {e}")
-
-def select_and_process():
-    video_path = filedialog.askopenfilename(
-        title="Select Video File",
-        filetypes=[("All video files", "*.*")]
-    )
-    if not video_path:
-        return
-    status_label["text"] = "Processing..."
-    threading.Thread(target=process_video, args=(video_path, lambda msg: status_label.config(text=msg)), daemon=True).start()
-
-root = tk.Tk()
-root.title("Auto Hebrew Subtitle Generator")
-
-tk.Label(root, text="Auto-Generate & Burn Hebrew Subtitles into Video", font=("Arial", 14, "bold")).pack(pady=10)
-tk.Button(root, text="Select Video and Start", font=("Arial", 12), command=select_and_process).pack(pady=10)
-status_label = tk.Label(root, text="Ready.", font=("Arial", 11), wraplength=400, justify="left")
-status_label.pack(padx=10, pady=20)
-
-root.mainloop()
+        burn_subtitles_multi(video_path, [(srt_path, output_path)], profile=DEFAULT_PROFILE,
+                             on_progress=lambda seconds: report(min(1.0, seconds / duration) if duration else 0.0))
+    except Cancelled:
+        # ffmpeg is stopped by now; a half-written video is of no use
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
+
+
+class SubtitleWorker(threading.Thread):
+    """
+    Works off the file queue in the background with one Whisper model loaded for every file.
+    Everything the window shows arrives through self.events, so Tk is only touched from the main thread.
+    """
+
+    def __init__(self, model_path=WHISPER_MODEL):
+        super().__init__(daemon=True, name="subtitle-worker")
+        self.model_path = model_path
+        # Queued video paths; taking one and clearing the cancel flag happen under the same lock as a cancel,
+        # so a "Cancel All" can never fall between the two and be lost
+        self.files = deque()
+        self._files_ready = threading.Condition()
+        self.events = queue.Queue()
+        self._cancel = threading.Event()
+        self._model = None
+
+    def add(self, video_path):
+        with self._files_ready:
+            self.files.append(video_path)
+            self.events.put(("queued", video_path))
+            self._files_ready.notify()
+
+    def cancel(self, everything=False):
+        """Stop the file being processed (Whisper or ffmpeg); with everything also drop the queued ones."""
+        with self._files_ready:
+            if everything:
+                while self.files:
+                    self.events.put(("removed", self.files.popleft()))
+            self._cancel.set()
+
+    def _report(self, video_path, stage, fraction):
+        if self._cancel.is_set():
+            raise Cancelled()
+        self.events.put(("progress", video_path, stage, fraction))
+
+    def model(self):
+        if self._model is None:
+            import whisper
+            self.events.put(("status", "Loading Whisper model..."))
+            self._model = whisper.load_model(self.model_path)
+            print("Model loaded!")
+        return self._model
+
+    def process(self, video_path):
+        model = self.model()
+        srt_path, duration = generate_hebrew_subs(
+            model, video_path, lambda fraction: self._report(video_path, "Transcribing", fraction))
+        return burn_subtitles(video_path, srt_path, duration,
+                              lambda fraction: self._report(video_path, "Burning", fraction))
+
+    def run(self):
+        while True:
+            with self._files_ready:
+                while not self.files:
+                    self._files_ready.wait()
+                video_path = self.files.popleft()
+                self._cancel.clear()
+            self.events.put(("started", video_path))
+            try:
+                self.events.put(("done", video_path, self.process(video_path)))
+            except Cancelled:
+                self.events.put(("cancelled", video_path))
+            except Exception as e:
+                self.events.put(("error", video_path, str(e)))
+
+
+class App:
+    def __init__(self, root, worker):
+        self.root = root
+        self.worker = worker
+        # [video path, state] per row of the queue list, in the order the worker takes them
+        self.rows = []
+        root.title("Auto Hebrew Subtitle Generator")
+        tk.Label(root, text="Auto-Generate & Burn Hebrew Subtitles into Video", font=("Arial", 14, "bold")).pack(pady=10)
+        buttons = tk.Frame(root)
+        buttons.pack(pady=5)
+        tk.Button(buttons, text="Add Videos...", font=("Arial", 12), command=self.select_files).pack(side="left", padx=5)
+        self.cancel_button = tk.Button(buttons, text="Cancel", font=("Arial", 12), state="disabled",
+                                       command=self.worker.cancel)
+        self.cancel_button.pack(side="left", padx=5)
+        tk.Button(buttons, text="Cancel All", font=("Arial", 12),
+                  command=lambda: self.worker.cancel(everything=True)).pack(side="left", padx=5)
+        self.queue_list = tk.Listbox(root, width=70, height=8)
+        self.queue_list.pack(padx=10, pady=5)
+        self.progress = ttk.Progressbar(root, length=400, maximum=100)
+        self.progress.pack(padx=10, pady=5)
+        hint = "Select videos or drop them here." if TkinterDnD else "Select videos to add them to the queue."
+        self.status_label = tk.Label(root, text=f"Ready. {hint}", font=("Arial", 11), wraplength=400, justify="left")
+        self.status_label.pack(padx=10, pady=20)
+        if TkinterDnD:
+            root.drop_target_register(DND_FILES)
+            root.dnd_bind("<<Drop>>", lambda event: self.add_files(root.tk.splitlist(event.data)))
+        root.after(POLL_MS, self.poll)
+
+    def select_files(self):
+        self.add_files(filedialog.askopenfilenames(title="Select Video Files", filetypes=[("All video files", "*.*")]))
+
+    def add_files(self, paths):
+        for path in paths:
+            self.worker.add(path)
+
+    def _set_state(self, video_path, state, current=("queued",)):
+        for i, row in enumerate(self.rows):
+            if row[0] == video_path and row[1] in current:
+                row[1] = state
+                self.queue_list.delete(i)
+                self.queue_list.insert(i, f"{state:>10}  {os.path.basename(video_path)}")
+                return
+
+    def poll(self):
+        while True:
+            try:
+                event = self.worker.events.get_nowait()
+            except queue.Empty:
+                break
+            self.handle(*event)
+        self.root.after(POLL_MS, self.poll)
+
+    def handle(self, kind, *args):
+        if kind == "status":
+            self.status_label.config(text=args[0])
+            return
+        video_path, name = args[0], os.path.basename(args[0])
+        if kind == "queued":
+            self.rows.append([video_path, None])
+            self.queue_list.insert("end", "")
+            self._set_state(video_path, "queued", current=(None,))
+        elif kind == "removed":
+            self._set_state(video_path, "removed")
+        elif kind == "started":
+            self._set_state(video_path, "running")
+            self.progress["value"] = 0
+            self.cancel_button.config(state="normal")
+            self.status_label.config(text=f"Processing {name}...")
+        elif kind == "progress":
+            stage, fraction = args[1], args[2]
+            done = fraction * TRANSCRIBE_SHARE if stage == "Transcribing" else \
+                TRANSCRIBE_SHARE + fraction * (1 - TRANSCRIBE_SHARE)
+            self.progress["value"] = done * 100
+            self.status_label.config(text=f"{stage} {name}: {fraction:.0%}")
+        else:
+            self._set_state(video_path, {"done": "done", "cancelled": "cancelled", "error": "failed"}[kind],
+                            current=("running",))
+            self.cancel_button.config(state="disabled")
+            if kind == "done":
+                self.progress["value"] = 100
+                self.status_label.config(text=f"Done!\nOutput video with Hebrew subtitles:\n{args[1]}")
+            elif kind == "cancelled":
+                self.status_label.config(text=f"Cancelled: {name}")
+            else:
+                self.status_label.config(text=f"Error in {name}:\n{args[1]}")
+
+
+if __name__ == "__main__":
+    root = TkinterDnD.Tk() if TkinterDnD else tk.Tk()
+    worker = SubtitleWorker()
+    App(root, worker)
+    worker.start()
+    root.mainloop()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from metrics import wav_duration
+from model_registry import BACKENDS, get_asr_pipeline, registry
+from transcription_multy import extract_audio
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def words(text):
+    return _WORD.findall(text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance (substitutions + insertions + deletions) over the reference length."""
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_reference(media_path):
+    # Reference transcript: <name>.txt next to the media file
+    txt_path = os.path.splitext(media_path)[0] + ".txt"
+    if not os.path.exists(txt_path):
+        return None
+    with open(txt_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def prepare_audio(media_paths, workdir):
+    audio = {}
+    for path in media_paths:
+        if path.lower().endswith(".wav"):
+            audio[path] = path
+        else:
+            audio[path] = os.path.join(workdir, f"{len(audio)}.wav")
+            extract_audio(path, audio[path])
+    return audio
+
+
+def run_backend(backend, model_dir, audio, task="transcribe", assistant_dir=None):
+    registry.clear()
+    started = time.perf_counter()
+    asr = get_asr_pipeline(model_dir, task=task, language="he", device="cpu", backend=backend,
+                           assistant_dir=assistant_dir)
+    load_seconds = time.perf_counter() - started
+    texts, wall, audio_seconds = {}, 0.0, 0.0
+    for media_path, audio_path in audio.items():
+        started = time.perf_counter()
+        result = asr(audio_path, return_timestamps=True)
+        wall += time.perf_counter() - started
+        audio_seconds += wav_duration(audio_path)
+        texts[media_path] = "".join(chunk['text'] for chunk in result['chunks'])
+    size_mb = registry.report()[0]["size_mb"]
+    return {
+        "backend": backend + ("+assistant" if assistant_dir else ""), "load_seconds": round(load_seconds, 3),
+        "wall_seconds": round(wall, 3), "real_time_factor": round(wall / audio_seconds, 4) if audio_seconds else None,
+        "size_mb": size_mb,
+    }, texts
+
+
+def main(media_paths, model_dir, backends=BACKENDS, task="transcribe", assistant_dir=None, output=None):
+    """
+    Transcribe the same files with every backend and compare speed and WER. WER is measured against
+    <name>.txt reference transcripts where they exist, otherwise against the first backend's output.
+    With assistant_dir every transformers backend also runs with assisted decoding, which must give
+    exactly the transcripts of the same backend without it.
+    """
+    rows, outputs = [], {}
+    with tempfile.TemporaryDirectory() as workdir:
+        audio = prepare_audio(media_paths, workdir)
+        runs = [(backend, None) for backend in backends]
+        if assistant_dir:
+            runs += [(backend, assistant_dir) for backend in backends if backend != "ct2"]
+        for backend, assistant in runs:
+            print(f"Running {backend}{' with assistant ' + assistant if assistant else ''}...")
+            try:
+                row, texts = run_backend(backend, model_dir, audio, task=task, assistant_dir=assistant)
+            except (RuntimeError, ImportError) as e:
+                print(f"  skipped: {e}")
+                continue
+            rows.append(row)
+            outputs[row["backend"]] = texts
+    if not rows:
+        print("No backend could be run")
+        return 1
+    first = rows[0]["backend"]
+    for row in rows:
+        errors = []
+        for media_path, text in outputs[row["backend"]].items():
+            reference = load_reference(media_path)
+            errors.append(word_error_rate(reference if reference is not None else outputs[first][media_path], text))
+        row["wer"] = round(sum(errors) / len(errors), 4)
+        row["speedup"] = round(rows[0]["wall_seconds"] / row["wall_seconds"], 2) if row["wall_seconds"] else None
+        unassisted = row["backend"].replace("+assistant", "")
+        if unassisted != row["backend"] and unassisted in outputs:
+            row["identical"] = outputs[row["backend"]] == outputs[unassisted]
+            row["assist_speedup"] = round(
+                next(r["wall_seconds"] for r in rows if r["backend"] == unassisted) / row["wall_seconds"], 2)
+    print(f"{'backend':>16} {'load':>8} {'wall':>9} {'RTF':>8} {'size MB':>8} {'WER':>7} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['backend']:>16} {row['load_seconds']:7.2f}s {row['wall_seconds']:8.2f}s "
+              f"{row['real_time_factor'] or 0:8.4f} {row['size_mb']:8.1f} {row['wer']:7.2%} {row['speedup'] or 0:7.2f}x")
+    mismatches = [row["backend"] for row in rows if row.get("identical") is False]
+    for row in rows:
+        if "identical" in row:
+            print(f"{row['backend']}: {row['assist_speedup']}x vs. without assistant, transcripts "
+                  f"{'identical' if row['identical'] else 'DIFFER'}")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"model": model_dir, "assistant": assistant_dir, "files": media_paths, "results": rows,
+                       "texts": outputs}, f, indent=2, ensure_ascii=False)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ASR inference backends on speed and word error rate.")
+    parser.add_argument("model_dir")
+    parser.add_argument("media", nargs="+", help="audio/video files, optionally with <name>.txt references")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--task", default="transcribe", choices=["transcribe", "translate"])
+    parser.add_argument("--assistant", help="small Whisper checkpoint to also run assisted decoding with")
+    parser.add_argument("--output", help="write results and transcripts as JSON")
+    args = parser.parse_args()
+    sys.exit(main(args.media, args.model_dir, backends=args.backends, task=args.task,
+                  assistant_dir=args.assistant, output=args.output))
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import wave
+
+import media
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "SUBS_ASR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "subs", "asr")
+)
+_BLOCK_FRAMES = 1 << 20
+
+
+def audio_fingerprint(audio_path):
+    """sha256 of the PCM samples of an extracted WAV (the header is ignored)."""
+    digest = hashlib.sha256()
+    with wave.open(audio_path, "rb") as wav:
+        digest.update(f"{wav.getframerate()}:{wav.getnchannels()}:{wav.getsampwidth()}".encode())
+        while True:
+            frames = wav.readframes(_BLOCK_FRAMES)
+            if not frames:
+                break
+            digest.update(frames)
+    return digest.hexdigest()
+
+
+def stream_fingerprint(video_path, audio_stream=None):
+    """
+    Streaming mode keys on the file instead: hashing the samples would decode the whole input once more
+    before the streamed decode. Path, size, mtime and the probed streams, plus the audio stream transcribed.
+    """
+    stat = os.stat(video_path)
+    identity = [os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, media.probe(video_path), audio_stream]
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+def _model_identity(model_dir):
+    # Path plus size/mtime of the top-level files, so replacing the weights invalidates old results.
+    model_dir = os.path.abspath(model_dir)
+    files = []
+    if os.path.isdir(model_dir):
+        for name in sorted(os.listdir(model_dir)):
+            path = os.path.join(model_dir, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                files.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+    return model_dir + "|" + ",".join(files)
+
+
+def asr_cache_key(audio_hash, model_dir, task="transcribe", language="he", **options):
+    # Options left at their off value (None/False) do not change the key.
+    options = {name: value for name, value in options.items() if value is not None and value is not False}
+    settings = {"model": _model_identity(model_dir), "task": task, "language": language, **options}
+    payload = audio_hash + json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], key + ".json")
+
+
+def load_cached_result(key, cache_dir=DEFAULT_CACHE_DIR):
+    try:
+        with open(_cache_path(key, cache_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_result(key, result, cache_dir=DEFAULT_CACHE_DIR):
+    path = _cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "text": result.get("text", ""),
+        "chunks": [{"timestamp": list(chunk["timestamp"]), "text": chunk["text"]} for chunk in result["chunks"]],
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def cached_asr(key, transcribe, cache_dir=DEFAULT_CACHE_DIR):
+    """Return (result, hit): the stored chunk list for key, or the output of transcribe() which is then stored."""
+    result = load_cached_result(key, cache_dir)
+    if result is not None:
+        return result, True
+    result = transcribe()
+    try:
+        store_result(key, result, cache_dir)
+    except OSError as e:
+        print(f"Could not store ASR result in cache: {e}")
+    return result, False
@@ -0,0 +1,84 @@
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def stream_audio(video_path, block_seconds=300, input_args=(), audio_stream=None):
+    """
+    Yield (start_seconds, float32 samples) blocks of 16 kHz mono audio decoded by ffmpeg into a pipe.
+    input_args go before -i, e.g. ['-follow', '1'] for a file that is still being written. audio_stream is
+    the index of the stream to decode; by default ffmpeg picks one.
+    """
+    cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', *input_args, '-i', video_path]
+    if audio_stream is not None:
+        cmd += ['-map', f'0:{audio_stream}']
+    cmd += ['-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1', 'pipe:1']
+    block_samples = int(block_seconds * SAMPLE_RATE)
+    buffer = np.empty(block_samples, dtype=np.int16)
+    view = memoryview(buffer).cast('B')
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    offset = 0
+    finished = False
+    try:
+        while True:
+            filled = 0
+            while filled < len(view):
+                n = proc.stdout.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+            samples_read = filled // 2
+            if samples_read:
+                yield offset / SAMPLE_RATE, buffer[:samples_read].astype(np.float32) / 32768.0
+                offset += samples_read
+            if filled < len(view):
+                break
+        finished = True
+    finally:
+        proc.stdout.close()
+        if not finished:
+            proc.kill()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _shift(chunk, base, default_end):
+    start, end = chunk['timestamp']
+    start = base + (start or 0.0)
+    end = base + end if end is not None else default_end
+    return {'timestamp': (start, end), 'text': chunk['text']}
+
+
+def transcribe_stream(video_path, asr, block_seconds=300, audio_stream=None):
+    """
+    Feed ffmpeg PCM blocks to the ASR pipeline one at a time.
+    The last segment of every block is re-decoded together with the next block, so words are not cut at
+    block boundaries; the carried audio is at most one segment long.
+    """
+    chunks = []
+    carry = np.zeros(0, dtype=np.float32)
+    carry_start = 0.0
+    for block_start, samples in stream_audio(video_path, block_seconds=block_seconds, audio_stream=audio_stream):
+        base = carry_start if len(carry) else block_start
+        audio = np.concatenate([carry, samples]) if len(carry) else samples
+        audio_end = base + len(audio) / SAMPLE_RATE
+        out = asr({"raw": audio, "sampling_rate": SAMPLE_RATE}, return_timestamps=True)
+        block_chunks = out['chunks']
+        last_start = block_chunks[-1]['timestamp'][0] if block_chunks else None
+        if len(block_chunks) > 1 and last_start:
+            chunks.extend(_shift(chunk, base, audio_end) for chunk in block_chunks[:-1])
+            cut = int(last_start * SAMPLE_RATE)
+            carry = audio[cut:].copy()
+            carry_start = base + cut / SAMPLE_RATE
+        else:
+            chunks.extend(_shift(chunk, base, audio_end) for chunk in block_chunks)
+            carry = np.zeros(0, dtype=np.float32)
+            carry_start = audio_end
+        print(f"Transcribed up to {carry_start:.0f}s")
+    if len(carry):
+        out = asr({"raw": carry, "sampling_rate": SAMPLE_RATE}, return_timestamps=True)
+        chunks.extend(_shift(chunk, carry_start, carry_start + len(carry) / SAMPLE_RATE) for chunk in out['chunks'])
+    return {"text": "".join(chunk['text'] for chunk in chunks), "chunks": chunks}
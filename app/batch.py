@@ -0,0 +1,393 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asr_cache import asr_cache_key, audio_fingerprint, load_cached_result, store_result
+from burn import BURN_PROFILES, DEFAULT_PROFILE, burn_subtitles_multi, mux_soft_subtitles
+from media import has_video
+from model_registry import BACKENDS, DEFAULT_BACKEND, get_asr_pipeline
+from pipeline import Stage, StagedExecutor
+from segments import ORIGINAL, SegmentTable
+from vad import load_speech, merge_results, prepare_speech, remap_result
+from transcription_multy import extract_audio, create_srts, source_language
+
+MEDIA_EXTENSIONS = {".mp4", ".mkv", ".avi", ".mov", ".webm", ".m4v", ".mp3", ".wav", ".m4a", ".flac"}
+
+
+def collect_inputs(source):
+    if os.path.isdir(source):
+        return [
+            os.path.join(source, name) for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+        ]
+    # Manifest: one path per line, blank lines and '#' comments ignored.
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+
+def write_report(report_path, statuses):
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(statuses, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, report_path)
+
+
+def _extract(video_path, audio_path):
+    started = time.perf_counter()
+    extract_audio(video_path, audio_path)
+    return time.perf_counter() - started
+
+
+def _transcribe_group(asr, audio_paths, batch_size, vad=False):
+    if vad:
+        # One input per group of speech regions, compacted only when the pipeline asks for it, so no more than
+        # a batch of VAD windows is held as float samples at once
+        groups, prepare_errors = [], []
+        for audio_path in audio_paths:
+            # A file VAD cannot read fails on its own, the rest of the group still goes to the model
+            try:
+                groups.append(prepare_speech(audio_path))
+                prepare_errors.append(None)
+            except Exception as e:
+                groups.append([])
+                prepare_errors.append(e)
+        items = [(audio_path, regions) for audio_path, file_groups in zip(audio_paths, groups)
+                 for regions in file_groups]
+        timelines = [None] * len(items)
+
+        def inputs():
+            for i, (audio_path, regions) in enumerate(items):
+                asr_input, timelines[i] = load_speech(audio_path, regions)
+                yield asr_input
+    else:
+        items = audio_paths
+
+        def inputs():
+            return list(audio_paths)
+    try:
+        outputs = list(asr(inputs(), return_timestamps=True, batch_size=batch_size)) if items else []
+        errors = [None] * len(items)
+    except Exception as e:
+        if len(items) == 1:
+            outputs, errors = [None], [e]
+        else:
+            print(f"Batched transcription failed ({e}), retrying {'windows' if vad else 'files'} one by one")
+            outputs, errors = [], []
+            for asr_input in inputs():
+                try:
+                    outputs.append(asr(asr_input, return_timestamps=True))
+                    errors.append(None)
+                except Exception as e:
+                    outputs.append(None)
+                    errors.append(e)
+    if not vad:
+        return outputs, errors
+    # Files without any speech have no groups and get an empty result
+    results, result_errors = [], []
+    it = iter(zip(outputs, errors, timelines))
+    for file_groups, error in zip(groups, prepare_errors):
+        remapped = []
+        for output, group_error, timeline in (next(it) for _ in file_groups):
+            error = error or group_error
+            if error is None:
+                remapped.append(remap_result(output, timeline))
+        results.append(merge_results(remapped) if error is None else None)
+        result_errors.append(error)
+    return results, result_errors
+
+
+def _finish_file(video_path, result, output_dir, output_languages, api_key, burn, soft, profile, source, status):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    srt_paths = {"orig": os.path.join(output_dir, f"{stem}_orig.srt")}
+    srt_paths.update((lang, os.path.join(output_dir, f"{stem}_{lang}.srt")) for lang in output_languages)
+    started = time.perf_counter()
+    create_srts(result, srt_paths, api_key=api_key, source=source)
+    status["translate_seconds"] = round(time.perf_counter() - started, 3)
+    status["srt"] = srt_paths
+    started = time.perf_counter()
+    if soft:
+        out_video = os.path.join(output_dir, f"{stem}_subs.mp4")
+        mux_soft_subtitles(video_path, list(srt_paths.items()), out_video)
+        status["videos"] = {"subs": out_video}
+    elif burn and not has_video(video_path):
+        print(f"{video_path}: no video stream, subtitles only")
+    elif burn:
+        status["videos"] = {lang: os.path.join(output_dir, f"{stem}_{lang}.mp4") for lang in srt_paths}
+        stats = burn_subtitles_multi(video_path, [(srt_paths[lang], status["videos"][lang]) for lang in srt_paths],
+                                     profile=profile)
+        status["encode_fps"] = stats["fps"]
+    status["burn_seconds"] = round(time.perf_counter() - started, 3)
+
+
+def _extract_item(item):
+    # Runs in the process pool
+    extract_audio(item["input"], item["audio_path"])
+    return [item]
+
+
+def _burn_item(item):
+    # Runs in the process pool; one output per language, so each burn can start as soon as its SRT is written
+    if not has_video(item["input"]):
+        item["video"] = None
+        return [item]
+    item["encode_fps"] = burn_subtitles_multi(item["input"], [(item["srt"], item["video"])],
+                                              profile=item["profile"])["fps"]
+    return [item]
+
+
+def run_pipelined(inputs, output_dir, model_dir, task="transcribe", output_languages=None, api_key=None,
+                  burn=True, soft=False, vad=False, burn_profile=DEFAULT_PROFILE, ffmpeg_workers=2,
+                  translate_workers=4, queue_size=2, backend=DEFAULT_BACKEND, report_path=None):
+    """
+    Like run_batch, but extraction, ASR, translation and burning run as concurrent stages with bounded queues:
+    while one file is transcribed the next one is extracting and the previous one's languages are
+    translating and burning, each language on its own.
+    """
+    output_languages = output_languages or []
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = report_path or os.path.join(output_dir, "batch_report.json")
+    statuses = [{"input": path, "status": "pending"} for path in inputs]
+    languages = ["orig"] + list(output_languages)
+    remaining = [len(languages)] * len(inputs)
+    asr = get_asr_pipeline(model_dir, task=task, language="he", backend=backend)
+    soft_tracks = {}
+    lock = threading.Lock()
+
+    def transcribe(item):
+        status = statuses[item["index"]]
+        key = asr_cache_key(audio_fingerprint(item["audio_path"]), model_dir, task=task, vad=vad, backend=backend)
+        result = load_cached_result(key)
+        status["asr_cache_hit"] = result is not None
+        if result is None:
+            results, errors = _transcribe_group(asr, [item["audio_path"]], 1, vad=vad)
+            if errors[0] is not None:
+                raise errors[0]
+            result = results[0]
+            try:
+                store_result(key, result)
+            except OSError as e:
+                print(f"Could not store ASR result in cache: {e}")
+        os.remove(item["audio_path"])
+        stem = os.path.splitext(os.path.basename(item["input"]))[0]
+        # One table per file: the language items share its columns, so a pivot is only translated once
+        table = SegmentTable.from_result(result, source=source_language(task))
+        return [dict(item, lang=lang, table=table, srt=os.path.join(output_dir, f"{stem}_{lang}.srt"),
+                     video=os.path.join(output_dir, f"{stem}_{lang}.mp4"), profile=burn_profile)
+                for lang in languages]
+
+    def translate(item):
+        table = item.pop("table")
+        if item["lang"] != ORIGINAL:
+            table.translate(item["lang"], api_key=api_key)
+        table.write({item["lang"]: item["srt"]})
+        return [item]
+
+    def mux(item):
+        # Soft subtitles need every language of a file, so this stage holds tracks until the last one arrives
+        with lock:
+            tracks = soft_tracks.setdefault(item["index"], {})
+            tracks[item["lang"]] = item["srt"]
+            if len(tracks) < len(languages):
+                item["video"] = None
+                return [item]
+            del soft_tracks[item["index"]]
+        stem = os.path.splitext(os.path.basename(item["input"]))[0]
+        item["video"] = os.path.join(output_dir, f"{stem}_subs.mp4")
+        mux_soft_subtitles(item["input"], [(lang, tracks[lang]) for lang in languages], item["video"])
+        return [item]
+
+    def on_item(item, stage, error):
+        status = statuses[item["index"]]
+        with lock:
+            for name, seconds in item.get("timings", {}).items():
+                if name in ("extract", "asr"):
+                    status[f"{name}_seconds"] = seconds
+                elif "lang" in item:
+                    status.setdefault(f"{name}_seconds", {})[item["lang"]] = seconds
+            if error is not None:
+                status.update(status="failed", stage=stage, error=str(error))
+                print(f"{stage} failed for {item['input']}{' (' + item['lang'] + ')' if 'lang' in item else ''}: {error}")
+                if "lang" not in item:
+                    remaining[item["index"]] = 0
+            else:
+                status.setdefault("srt", {})[item["lang"]] = item["srt"]
+                if soft and item["video"]:
+                    status["videos"] = {"subs": item["video"]}
+                elif burn and not soft and item["video"]:
+                    status.setdefault("videos", {})[item["lang"]] = item["video"]
+                    status.setdefault("encode_fps", {})[item["lang"]] = item["encode_fps"]
+            if "lang" in item:
+                remaining[item["index"]] -= 1
+            if remaining[item["index"]] <= 0:
+                if status["status"] == "pending":
+                    status["status"] = "done"
+                    print(f"Done: {item['input']}")
+                write_report(report_path, statuses)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stages = [
+            Stage("extract", _extract_item, workers=ffmpeg_workers, queue_size=queue_size, process=True),
+            # One loaded model, so one transcription at a time
+            Stage("asr", transcribe, workers=1, queue_size=queue_size),
+            Stage("translate", translate, workers=translate_workers, queue_size=queue_size * len(languages)),
+        ]
+        if soft:
+            stages.append(Stage("mux", mux, workers=1, queue_size=queue_size * len(languages)))
+        elif burn:
+            stages.append(Stage("burn", _burn_item, workers=ffmpeg_workers, queue_size=queue_size * len(languages),
+                                process=True))
+        items = ({"index": i, "input": path, "audio_path": os.path.join(tmpdir, f"audio_{i}.wav")}
+                 for i, path in enumerate(inputs))
+        StagedExecutor(stages, on_item=on_item).run(items)
+
+    write_report(report_path, statuses)
+    done = sum(1 for status in statuses if status["status"] == "done")
+    print(f"Batch finished: {done}/{len(statuses)} succeeded. Report: {report_path}")
+    return statuses
+
+
+def run_batch(inputs, output_dir, model_dir, task="transcribe", output_languages=None, api_key=None,
+              batch_size=4, prefetch=2, burn=True, soft=False, vad=False, burn_profile=DEFAULT_PROFILE,
+              backend=DEFAULT_BACKEND, report_path=None):
+    output_languages = output_languages or []
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = report_path or os.path.join(output_dir, "batch_report.json")
+    statuses = [{"input": path, "status": "pending"} for path in inputs]
+    asr = get_asr_pipeline(model_dir, task=task, language="he", backend=backend)
+
+    with tempfile.TemporaryDirectory() as tmpdir, ThreadPoolExecutor(max_workers=max(1, prefetch)) as pool:
+        # Extraction runs ahead of the ASR by at most batch_size + prefetch files.
+        pending = deque()
+        next_index = 0
+
+        def fill():
+            nonlocal next_index
+            while next_index < len(inputs) and len(pending) < batch_size + prefetch:
+                audio_path = os.path.join(tmpdir, f"audio_{next_index}.wav")
+                pending.append((next_index, audio_path, pool.submit(_extract, inputs[next_index], audio_path)))
+                next_index += 1
+
+        fill()
+        while pending:
+            group = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+            fill()
+            ready, transcribed = [], []
+            for index, audio_path, future in group:
+                status = statuses[index]
+                try:
+                    status["extract_seconds"] = round(future.result(), 3)
+                    key = asr_cache_key(audio_fingerprint(audio_path), model_dir, task=task, vad=vad, backend=backend)
+                except Exception as e:
+                    status.update(status="failed", stage="extract", error=str(e))
+                    print(f"Extracting audio failed for {inputs[index]}: {e}")
+                    continue
+                result = load_cached_result(key)
+                status["asr_cache_hit"] = result is not None
+                if result is not None:
+                    transcribed.append((index, audio_path, result, None))
+                else:
+                    ready.append((index, audio_path, key))
+            if ready:
+                print(f"Transcribing {len(ready)} file(s)...")
+                started = time.perf_counter()
+                try:
+                    results, errors = _transcribe_group(asr, [audio_path for _, audio_path, _ in ready], batch_size,
+                                                        vad=vad)
+                except Exception as e:
+                    # Only the files of this group fail; the batch goes on with the next one
+                    results, errors = [None] * len(ready), [e] * len(ready)
+                asr_seconds = round((time.perf_counter() - started) / len(ready), 3)
+                for (index, _, key), result, error in zip(ready, results, errors):
+                    statuses[index]["asr_seconds"] = asr_seconds
+                    if error is None:
+                        try:
+                            store_result(key, result)
+                        except OSError as e:
+                            print(f"Could not store ASR result in cache: {e}")
+                transcribed += [(index, audio_path, result, error)
+                                for (index, audio_path, _), result, error in zip(ready, results, errors)]
+            for index, audio_path, result, error in sorted(transcribed, key=lambda item: item[0]):
+                status = statuses[index]
+                os.remove(audio_path)
+                if error is not None:
+                    status.update(status="failed", stage="transcribe", error=str(error))
+                    print(f"Transcription failed for {inputs[index]}: {error}")
+                    continue
+                try:
+                    _finish_file(inputs[index], result, output_dir, output_languages, api_key, burn, soft,
+                                 burn_profile, source_language(task), status)
+                    status["status"] = "done"
+                    print(f"Done: {inputs[index]}")
+                except Exception as e:
+                    status.update(status="failed", stage="output", error=str(e))
+                    print(f"Writing outputs failed for {inputs[index]}: {e}")
+            write_report(report_path, statuses)
+
+    done = sum(1 for status in statuses if status["status"] == "done")
+    print(f"Batch finished: {done}/{len(statuses)} succeeded. Report: {report_path}")
+    return statuses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe a folder or manifest of videos with one loaded model.")
+    parser.add_argument("source", help="directory of videos, or a manifest file with one path per line")
+    parser.add_argument("output_dir")
+    parser.add_argument("model_dir")
+    parser.add_argument("task", nargs="?", default="transcribe", choices=["transcribe", "translate"])
+    parser.add_argument("languages", nargs="*", help="target languages for translated subtitles")
+    parser.add_argument("--batch-size", type=int, default=4, help="audio files per pipeline call")
+    parser.add_argument("--prefetch", type=int, default=2, help="files to extract ahead of the transcription")
+    parser.add_argument("--no-burn", action="store_true", help="only write SRT files")
+    parser.add_argument("--soft", action="store_true", help="mux SRTs as subtitle tracks instead of burning")
+    parser.add_argument("--burn-profile", default=DEFAULT_PROFILE, choices=list(BURN_PROFILES))
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="ASR inference mode")
+    parser.add_argument("--vad", action="store_true", help="only send detected speech to the model")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="overlap extraction, ASR, translation and burning of different files and languages")
+    parser.add_argument("--ffmpeg-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="concurrent ffmpeg extractions and burns (--pipelined)")
+    parser.add_argument("--translate-workers", type=int, default=4, help="concurrent translations (--pipelined)")
+    parser.add_argument("--report", help="status report path (default: OUTPUT_DIR/batch_report.json)")
+    args = parser.parse_args()
+    GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "key")
+    if args.pipelined:
+        run_pipelined(
+            collect_inputs(args.source),
+            args.output_dir,
+            args.model_dir,
+            task=args.task,
+            output_languages=args.languages,
+            api_key=GOOGLE_API_KEY,
+            burn=not args.no_burn,
+            soft=args.soft,
+            vad=args.vad,
+            burn_profile=args.burn_profile,
+            backend=args.backend,
+            ffmpeg_workers=args.ffmpeg_workers,
+            translate_workers=args.translate_workers,
+            report_path=args.report
+        )
+    else:
+        run_batch(
+            collect_inputs(args.source),
+            args.output_dir,
+            args.model_dir,
+            task=args.task,
+            output_languages=args.languages,
+            api_key=GOOGLE_API_KEY,
+            batch_size=args.batch_size,
+            prefetch=args.prefetch,
+            burn=not args.no_burn,
+            soft=args.soft,
+            vad=args.vad,
+            burn_profile=args.burn_profile,
+            backend=args.backend,
+            report_path=args.report
+        )
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from burn import BURN_PROFILES, DEFAULT_PROFILE, burn_subtitles_multi
+from metrics import Metrics, wav_duration
+from transcription_multy import extract_audio, create_srt, burn_subtitles, transcribe_audio
+
+DEFAULT_LENGTHS = [10, 60, 300]
+AUDIO_SOURCES = {
+    "tone": "sine=frequency=440:sample_rate=44100",
+    "noise": "anoisesrc=color=pink:sample_rate=44100:amplitude=0.3",
+}
+# A stage is reported as a regression when it is this much slower than the baseline.
+DEFAULT_TOLERANCE = 0.15
+
+
+class StubASR:
+    """Stands in for the Whisper pipeline: one fixed chunk every 5 seconds, no model needed."""
+
+    def __call__(self, audio_path, return_timestamps=True):
+        duration = wav_duration(audio_path)
+        chunks = []
+        start = 0.0
+        while start < duration:
+            end = min(start + 5.0, duration)
+            chunks.append({"timestamp": (start, end), "text": f" Segment at {start:.0f} seconds."})
+            start = end
+        return {"text": "".join(chunk["text"] for chunk in chunks), "chunks": chunks}
+
+
+def generate_media(path, seconds, audio="tone"):
+    cmd = [
+        'ffmpeg', '-y', '-nostdin', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size=640x360:rate=25:duration={seconds}',
+        '-f', 'lavfi', '-i', f'{AUDIO_SOURCES[audio]}:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+        path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def run_case(video_path, workdir, asr, repeats=3, burn_profiles=(DEFAULT_PROFILE,)):
+    """Time every stage `repeats` times and keep the median of each measurement."""
+    runs = []
+    for i in range(repeats):
+        metrics = Metrics(job=os.path.basename(video_path))
+        audio_path = os.path.join(workdir, "audio.wav")
+        srt_path = os.path.join(workdir, "bench.srt")
+        started = time.perf_counter()
+        with metrics.stage("extract_audio") as record:
+            extract_audio(video_path, audio_path)
+            record["audio_seconds"] = audio_seconds = wav_duration(audio_path)
+        with metrics.stage("asr", audio_seconds=audio_seconds):
+            result = transcribe_audio(audio_path, None, asr=asr)
+        with metrics.stage("create_srt", audio_seconds=audio_seconds):
+            create_srt(result, srt_path)
+        for profile in burn_profiles:
+            # The default profile keeps the plain "burn" name so older baselines still compare
+            stage = "burn" if profile == DEFAULT_PROFILE else f"burn_{profile}"
+            with metrics.stage(stage, audio_seconds=audio_seconds, profile=profile) as record:
+                record["encode_fps"] = burn_subtitles(video_path, srt_path, os.path.join(workdir, "burned.mp4"),
+                                                      profile=profile)["fps"]
+        with metrics.stage("burn_multi_3", audio_seconds=audio_seconds) as record:
+            record["encode_fps"] = burn_subtitles_multi(
+                video_path, [(srt_path, os.path.join(workdir, f"burned_{n}.mp4")) for n in range(3)])["fps"]
+        end_to_end = time.perf_counter() - started
+        run = {record["stage"]: record for record in metrics.records}
+        run["end_to_end"] = {
+            "stage": "end_to_end", "wall_seconds": round(end_to_end, 3),
+            "real_time_factor": round(end_to_end / audio_seconds, 4),
+            "process_peak_rss_mb": max(record["process_peak_rss_mb"] for record in metrics.records),
+        }
+        runs.append(run)
+    summary = {}
+    for stage in runs[0]:
+        summary[stage] = {
+            field: statistics.median(run[stage][field] for run in runs)
+            for field in ("wall_seconds", "real_time_factor", "peak_rss_mb", "process_peak_rss_mb", "encode_fps")
+            if field in runs[0][stage]
+        }
+    return summary
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for case, stages in results.items():
+        for stage, values in stages.items():
+            before = baseline.get(case, {}).get(stage, {}).get("wall_seconds")
+            if not before:
+                continue
+            change = (values["wall_seconds"] - before) / before
+            marker = "  REGRESSION" if change > tolerance else ""
+            print(f"{case:>12} {stage:>14}: {before:8.3f}s -> {values['wall_seconds']:8.3f}s ({change:+.1%}){marker}")
+            if marker:
+                regressions.append((case, stage, change))
+    return regressions
+
+
+def main(lengths, model_dir=None, repeats=3, output=None, baseline_path=None, save_baseline=None,
+         tolerance=DEFAULT_TOLERANCE, burn_profiles=(DEFAULT_PROFILE,)):
+    if model_dir:
+        from model_registry import get_asr_pipeline
+        started = time.perf_counter()
+        asr = get_asr_pipeline(model_dir, task="transcribe", language="he", device="cpu")
+        print(f"Model load: {time.perf_counter() - started:.2f}s")
+    else:
+        print("No model given, using the stub ASR (measures everything except Whisper)")
+        asr = StubASR()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for seconds in lengths:
+            for audio in AUDIO_SOURCES:
+                case = f"{audio}_{seconds}s"
+                video_path = os.path.join(workdir, f"{case}.mp4")
+                generate_media(video_path, seconds, audio=audio)
+                print(f"Running {case}...")
+                results[case] = run_case(video_path, workdir, asr, repeats=repeats, burn_profiles=burn_profiles)
+                for stage, values in results[case].items():
+                    print(f"  {stage:>14}: {values['wall_seconds']:8.3f}s  RTF {values.get('real_time_factor', 0):.4f}"
+                          + (f"  peak RSS {values['peak_rss_mb']} MB" if "peak_rss_mb" in values else
+                             f"  process peak RSS {values['process_peak_rss_mb']} MB")
+                          + (f"  {values['encode_fps']} encode fps" if "encode_fps" in values else ""))
+    report = {"model": model_dir or "stub", "repeats": repeats, "results": results}
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if save_baseline:
+        with open(save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved: {save_baseline}")
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("model") != report["model"]:
+            print(f"Warning: baseline was recorded with {baseline.get('model')}, this run uses {report['model']}")
+        regressions = compare(results, baseline["results"], tolerance=tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark for extraction, ASR, SRT creation and burning.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=DEFAULT_LENGTHS, help="clip lengths in seconds")
+    parser.add_argument("--model-dir", help="local (tiny) Whisper checkpoint; the stub ASR is used without it")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against a baseline JSON and exit 1 on regressions")
+    parser.add_argument("--save-baseline", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--burn-profiles", nargs="+", default=[DEFAULT_PROFILE], choices=list(BURN_PROFILES),
+                        help="encoder profiles to time the single burn with")
+    args = parser.parse_args()
+    sys.exit(main(args.lengths, model_dir=args.model_dir, repeats=args.repeats, output=args.output,
+                  baseline_path=args.baseline, save_baseline=args.save_baseline, tolerance=args.tolerance,
+                  burn_profiles=args.burn_profiles))
@@ -0,0 +1,225 @@
+import bisect
+import os
+import subprocess
+import tempfile
+import time
+
+from media import FFMPEG_WORKERS, ffmpeg_pool, ffmpeg_slot, probe, run_ffmpeg
+from subtitle_writer import SubtitleWriter
+
+SUBTITLE_STYLE = "FontName=Arial"
+
+# Software encoder settings, so the same profile gives the same output on every machine.
+# threads 0 lets the encoder pick, filter_threads 0 means one per core.
+BURN_PROFILES = {
+    "fast-preview": {"codec": "libx264", "preset": "veryfast", "crf": 28, "threads": 0, "filter_threads": 0},
+    "balanced": {"codec": "libx264", "preset": "medium", "crf": 23, "threads": 0, "filter_threads": 0},
+    "archival": {"codec": "libx265", "preset": "slow", "crf": 20, "threads": 0, "filter_threads": 0},
+}
+DEFAULT_PROFILE = "balanced"
+# Source codecs whose stream can be concatenated with segments from each encoder
+_CODEC_FAMILIES = {"libx264": "h264", "libx265": "hevc"}
+
+
+def subtitles_filter(srt_path):
+    return f"subtitles={srt_path}:force_style='{SUBTITLE_STYLE}'"
+
+
+def _profile(name):
+    if name not in BURN_PROFILES:
+        raise ValueError(f"unknown burn profile {name}, expected one of {', '.join(BURN_PROFILES)}")
+    return BURN_PROFILES[name]
+
+
+def encoder_args(profile_name, threads=None):
+    """threads overrides the profile's, for encodes that share the cores with others running alongside."""
+    profile = _profile(profile_name)
+    return ['-c:v', profile['codec'], '-preset', profile['preset'], '-crf', str(profile['crf']),
+            '-threads', str(threads or profile['threads'])]
+
+
+def _filter_threads(profile_name, threads=None):
+    return str(threads or _profile(profile_name)['filter_threads'] or os.cpu_count() or 1)
+
+
+def run_encode(cmd, profile_name, on_progress=None):
+    """
+    Run an ffmpeg encode and report the achieved encode speed from its -progress output.
+    on_progress gets the seconds of output encoded so far; if it raises, ffmpeg is stopped.
+    """
+    cmd = cmd[:1] + ['-nostats', '-progress', 'pipe:1'] + cmd[1:]
+    with ffmpeg_slot():
+        started = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        frames = 0
+        try:
+            for line in proc.stdout:
+                key, _, value = line.strip().partition("=")
+                if key == "frame":
+                    frames = int(value or 0)
+                elif key == "out_time_us" and on_progress and value.isdigit():
+                    on_progress(int(value) / 1e6)
+        except BaseException:
+            proc.terminate()
+            proc.wait()
+            raise
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        seconds = time.perf_counter() - started
+    stats = {"profile": profile_name, "frames": frames, "seconds": round(seconds, 3),
+             "fps": round(frames / seconds, 1) if seconds else 0.0}
+    print(f"Encoded {frames} frames in {seconds:.1f}s ({stats['fps']} fps, profile {profile_name})")
+    return stats
+
+
+def burn_subtitles_multi(video_path, outputs, profile=DEFAULT_PROFILE, on_progress=None):
+    """
+    Burn several SRT files in one ffmpeg run: the input is decoded once and the video is split
+    into one subtitles filter and encoder per output.
+    outputs is a list of (srt_path, output_path).
+    """
+    filters = [f"[0:v]split={len(outputs)}" + "".join(f"[v{i}]" for i in range(len(outputs)))]
+    for i, (srt_path, _) in enumerate(outputs):
+        filters.append(f"[v{i}]{subtitles_filter(srt_path)}[out{i}]")
+    cmd = ['ffmpeg', '-y', '-filter_complex_threads', _filter_threads(profile), '-i', video_path,
+           '-filter_complex', ";".join(filters)]
+    for i, (_, output_path) in enumerate(outputs):
+        cmd += ['-map', f'[out{i}]', '-map', '0:a?'] + encoder_args(profile) + ['-c:a', 'copy', output_path]
+    return run_encode(cmd, profile, on_progress=on_progress)
+
+
+def keyframe_times(video_path):
+    # Packet flags are enough to find keyframes, nothing gets decoded
+    out = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+         '-of', 'csv=p=0', video_path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    times = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.append(float(pts))
+    return sorted(times)
+
+
+def read_srt_cues(srt_path):
+    """(start, end, text) of every cue in an SRT file written by SubtitleWriter."""
+    def seconds(stamp):
+        h, m, rest = stamp.strip().replace(",", ".").split(":")
+        return int(h) * 3600 + int(m) * 60 + float(rest)
+
+    cues = []
+    with open(srt_path, encoding="utf-8") as f:
+        blocks = f.read().strip().split("\n\n")
+    for block in blocks:
+        lines = block.splitlines()
+        timing = next((i for i, line in enumerate(lines) if "-->" in line), None)
+        if timing is None:
+            continue
+        start, end = lines[timing].split("-->")
+        cues.append((seconds(start), seconds(end), "\n".join(lines[timing + 1:])))
+    return cues
+
+
+def plan_segments(cues, keyframes, duration):
+    """
+    Split [0, duration] into ("copy" | "encode", start, end) pieces. Encoded pieces cover every cue and
+    start and end on keyframes, so the copied pieces in between can be cut without re-encoding.
+    """
+    ranges = []
+    for start, end, _ in cues:
+        i = bisect.bisect_right(keyframes, start)
+        j = bisect.bisect_right(keyframes, end)
+        range_start = keyframes[i - 1] if i else 0.0
+        range_end = keyframes[j] if j < len(keyframes) else duration
+        if ranges and range_start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], range_end))
+        else:
+            ranges.append((range_start, range_end))
+    pieces = []
+    position = 0.0
+    for start, end in ranges:
+        if start > position:
+            pieces.append(("copy", position, start))
+        pieces.append(("encode", start, end))
+        position = end
+    if position < duration:
+        pieces.append(("copy", position, duration))
+    return pieces
+
+
+def burn_subtitles_segments(video_path, srt_path, output_path, profile=DEFAULT_PROFILE):
+    """
+    Re-encode only the stretches of video that carry subtitles and stream-copy the rest.
+    Pieces are written as MPEG-TS (parameter sets in band), joined with the concat demuxer and muxed
+    with the untouched original audio. Falls back to a full burn when the source codec does not match
+    the profile's encoder.
+    """
+    info = probe(video_path)
+    codec, duration = info["video"]["codec"] if info["video"] else None, info["duration"]
+    if _CODEC_FAMILIES.get(_profile(profile)['codec']) != codec:
+        print(f"Source video is {codec}, profile {profile} encodes {_profile(profile)['codec']}: burning everything")
+        return burn_subtitles_multi(video_path, [(srt_path, output_path)], profile=profile)
+    cues = read_srt_cues(srt_path)
+    pieces = plan_segments(cues, keyframe_times(video_path), duration)
+    encoded = sum(end - start for kind, start, end in pieces if kind == "encode")
+    print(f"Encoding {encoded:.0f}s of {duration:.0f}s, copying the rest ({len(pieces)} pieces)")
+    # Encodes running side by side split the cores between them instead of each spreading over all of them
+    parallel = min(FFMPEG_WORKERS, sum(1 for kind, _, _ in pieces if kind == "encode")) or 1
+    threads = max(1, (os.cpu_count() or 1) // parallel)
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        def write_piece(i, kind, start, end):
+            piece_path = os.path.join(tmpdir, f"piece_{i:05d}.ts")
+            cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-filter_threads', _filter_threads(profile, threads),
+                   '-ss', f"{start:.3f}", '-to', f"{end:.3f}", '-i', video_path, '-map', '0:v:0']
+            if kind == "copy":
+                run_ffmpeg(cmd + ['-c', 'copy', piece_path])
+                return piece_path, 0
+            # Cue times relative to the piece start, which -ss on the input turns into 0
+            piece_srt = os.path.join(tmpdir, f"piece_{i:05d}.srt")
+            with SubtitleWriter(piece_srt) as writer:
+                for cue_start, cue_end, text in cues:
+                    if cue_end > start and cue_start < end:
+                        writer.write(max(cue_start - start, 0.0), min(cue_end, end) - start, text)
+            cmd += ['-vf', subtitles_filter(piece_srt)]
+            return piece_path, run_encode(cmd + encoder_args(profile, threads) + [piece_path], profile)["frames"]
+
+        # Pieces are independent; the ffmpeg pool runs up to FFMPEG_WORKERS of them at once
+        futures = [ffmpeg_pool().submit(write_piece, i, *piece) for i, piece in enumerate(pieces)]
+        written = [future.result() for future in futures]
+        frames = sum(piece_frames for _, piece_frames in written)
+        list_path = os.path.join(tmpdir, "pieces.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.writelines(f"file '{path}'\n" for path, _ in written)
+        run_ffmpeg(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                    '-i', video_path, '-map', '0:v', '-map', '1:a?', '-c', 'copy', output_path])
+    seconds = time.perf_counter() - started
+    stats = {"profile": profile, "frames": frames, "seconds": round(seconds, 3),
+             "fps": round(frames / seconds, 1) if seconds else 0.0, "encoded_seconds": round(encoded, 3)}
+    print(f"Segment burn done in {seconds:.1f}s ({stats['fps']} encoded fps overall)")
+    return stats
+
+
+def mux_soft_subtitles(video_path, srt_tracks, output_path):
+    """
+    Add SRT files as selectable subtitle tracks without re-encoding video or audio.
+    srt_tracks is a list of (language, srt_path).
+    """
+    cmd = ['ffmpeg', '-y', '-i', video_path]
+    for _, srt_path in srt_tracks:
+        cmd += ['-i', srt_path]
+    cmd += ['-map', '0:v?', '-map', '0:a?']
+    for i in range(len(srt_tracks)):
+        cmd += ['-map', f'{i + 1}:0']
+    # MP4/MOV only carry mov_text subtitles; Matroska and friends take SRT as is.
+    mp4_like = os.path.splitext(output_path)[1].lower() in (".mp4", ".m4v", ".mov")
+    cmd += ['-c:v', 'copy', '-c:a', 'copy', '-c:s', 'mov_text' if mp4_like else 'srt']
+    for i, (lang, _) in enumerate(srt_tracks):
+        cmd += [f'-metadata:s:s:{i}', f'title={lang}']
+        if lang != 'orig':
+            cmd += [f'-metadata:s:s:{i}', f'language={lang}']
+    cmd.append(output_path)
+    run_ffmpeg(cmd)
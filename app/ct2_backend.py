@@ -0,0 +1,68 @@
+import os
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Where converted CTranslate2 weights are looked for, relative to the HF checkpoint directory.
+CT2_SUBDIRS = ("ct2", "ctranslate2")
+
+
+def find_ct2_weights(model_dir):
+    """
+    Local CTranslate2 weights for a checkpoint: model_dir itself, a ct2/ or ctranslate2/ subdirectory,
+    or a sibling <model_dir>-ct2 directory (what ct2-transformers-converter produces by default here).
+    """
+    model_dir = os.path.abspath(model_dir)
+    candidates = [model_dir] + [os.path.join(model_dir, name) for name in CT2_SUBDIRS] + [model_dir + "-ct2"]
+    for path in candidates:
+        if os.path.isfile(os.path.join(path, "model.bin")):
+            return path
+    return None
+
+
+def _load_audio(asr_input):
+    if isinstance(asr_input, dict):
+        if asr_input.get("sampling_rate", SAMPLE_RATE) != SAMPLE_RATE:
+            raise ValueError(f"expected {SAMPLE_RATE} Hz audio, got {asr_input['sampling_rate']}")
+        return np.asarray(asr_input["raw"], dtype=np.float32)
+    with wave.open(asr_input, "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            # Not our 16 kHz mono PCM, let faster-whisper decode it
+            return asr_input
+        data = wav.readframes(wav.getnframes())
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+class CT2WhisperPipeline:
+    """
+    faster-whisper (CTranslate2) engine behind the same call signature and result format as the
+    transformers ASR pipeline: a path, {"raw", "sampling_rate"} dict or a list of them in,
+    {"text", "chunks": [{"timestamp": (start, end), "text"}]} out.
+    """
+
+    def __init__(self, weights_dir, task="transcribe", language="he", device="cpu", compute_type="int8",
+                 beam_size=1):
+        from faster_whisper import WhisperModel
+        self.weights_dir = weights_dir
+        self.task = task
+        self.language = language
+        self.beam_size = beam_size
+        self.model = WhisperModel(weights_dir, device=device, compute_type=compute_type, local_files_only=True)
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.weights_dir, name)) for name in os.listdir(self.weights_dir)
+            if os.path.isfile(os.path.join(self.weights_dir, name))
+        )
+
+    def _transcribe(self, asr_input):
+        segments, _ = self.model.transcribe(_load_audio(asr_input), task=self.task, language=self.language,
+                                            beam_size=self.beam_size)
+        chunks = [{"timestamp": (segment.start, segment.end), "text": segment.text} for segment in segments]
+        return {"text": "".join(chunk["text"] for chunk in chunks), "chunks": chunks}
+
+    def __call__(self, inputs, return_timestamps=True, batch_size=None, **kwargs):
+        if isinstance(inputs, list):
+            return [self._transcribe(asr_input) for asr_input in inputs]
+        return self._transcribe(inputs)
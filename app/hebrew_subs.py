@@ -1,51 +1,23 @@
 import os
-import subprocess
+import shutil
 import tempfile
-import srt
-from transformers import pipeline, WhisperForConditionalGeneration, AutoTokenizer, AutoFeatureExtractor, \
-    GenerationConfig
-from deep_translator import GoogleTranslator
-from googletrans import Translator
+
+import media
+from asr_cache import asr_cache_key, audio_fingerprint, cached_asr
+from burn import burn_subtitles_multi
+from model_registry import DEFAULT_BACKEND, get_asr_pipeline
+from subtitle_writer import SubtitleWriter
+from translation import translate_texts
 
 
 def extract_audio(video_path, audio_path):
-    cmd = [
-        'ffmpeg', '-y', '-i', video_path,
-        '-ar', '16000', '-ac', '1', '-c:a', 'pcm_s16le',
-        audio_path
-    ]
-    subprocess.run(cmd, check=True)
+    # The audio is not Hebrew (it goes through Whisper's translate task), so the default track is used
+    return media.extract_audio(video_path, audio_path)
 
 
 def transcribe_audio_to_hebrew(audio_path, model_dir):
-    model = WhisperForConditionalGeneration.from_pretrained(model_dir, local_files_only=True)
-    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
-    feature_extractor = AutoFeatureExtractor.from_pretrained(model_dir, local_files_only=True)
-
-    # --- Begin PATCH for generation config ---
-    if not hasattr(model, "generation_config") or model.generation_config is None:
-        model.generation_config = GenerationConfig.from_pretrained(model_dir, local_files_only=True)
-
-    # Patch config for missing attributes
-    # (make sure these attributes exist; set as needed)
-    import torch
-    if getattr(model.generation_config, "no_timestamps_token_id", None) is None:
-        model.generation_config.no_timestamps_token_id = tokenizer.convert_tokens_to_ids("<|notimestamps|>")
-    if getattr(model.generation_config, "task", None) is None:
-        model.generation_config.task = "translate"
-        # model.generation_config.task = "transcribe"
-    if getattr(model.generation_config, "language", None) is None:
-        model.generation_config.language = "he"
-    # --- End PATCH ---
-
-    asr = pipeline(
-        "automatic-speech-recognition",
-        model=model,
-        tokenizer=tokenizer,
-        feature_extractor=feature_extractor,
-        generate_kwargs={"task": "translate"}
-        # generate_kwargs={"task": "transcribe"}
-    )
+    asr = get_asr_pipeline(model_dir, task="translate", language="he")
+    # asr = get_asr_pipeline(model_dir, task="transcribe", language="he")
     result = asr(audio_path, return_timestamps=True)
     return result
 
@@ -83,37 +55,17 @@ def transcribe_audio_to_hebrew(audio_path, model_dir):
 #         f.write(srt.compose(subs))
 
 
-def create_srt(result, srt_path, to_language="he"):
-    translator = GoogleTranslator(source='auto', target=to_language)
-    subs = []
-    for i, chunk in enumerate(result['chunks']):
-        start = chunk['timestamp'][0]
-        end = chunk['timestamp'][1]
-        text = chunk['text'].strip()
-        # Translate to Hebrew
-        try:
-            translated = translator.translate(text)
-        except Exception as e:
-            print(f"Translation error: {e}")
-            translated = text
-        subs.append(srt.Subtitle(
-            index=i + 1,
-            start=srt.timedelta(seconds=start),
-            end=srt.timedelta(seconds=end),
-            content=translated
-        ))
-    with open(srt_path, "w", encoding="utf-8") as f:
-        f.write(srt.compose(subs))
+def create_srt(result, srt_path, to_language="he", api_key=None, backend=None):
+    texts = [chunk['text'].strip() for chunk in result['chunks']]
+    # Translate to Hebrew with the configured provider (SUBS_TRANSLATOR) unless backend names one; the audio
+    # went through Whisper's translate task, so the source is English
+    translations = translate_texts(texts, target=to_language, api_key=api_key, backend=backend, source="en")
+    with SubtitleWriter(srt_path) as writer:
+        for chunk, translated in zip(result['chunks'], translations):
+            writer.write(chunk['timestamp'][0], chunk['timestamp'][1], translated)
 
 def burn_subtitles(video_path, srt_path, output_path):
-    cmd = [
-        'ffmpeg', '-y',
-        '-i', video_path,
-        '-vf', f"subtitles={srt_path}:force_style='FontName=Arial'",
-        '-c:a', 'copy',
-        output_path
-    ]
-    subprocess.run(cmd, check=True)
+    return burn_subtitles_multi(video_path, [(srt_path, output_path)])
 
 def main(video_path, output_path, model_dir):
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -122,9 +74,17 @@ def main(video_path, output_path, model_dir):
         print("Extracting audio...")
         extract_audio(video_path, audio_path)
         print("Transcribing and translating to Hebrew...")
-        result = transcribe_audio_to_hebrew(audio_path, model_dir)
+        key = asr_cache_key(audio_fingerprint(audio_path), model_dir, task="translate", backend=DEFAULT_BACKEND)
+        result, cache_hit = cached_asr(key, lambda: transcribe_audio_to_hebrew(audio_path, model_dir))
+        print(f"ASR cache {'hit, skipped Whisper' if cache_hit else 'miss'}")
         print("Creating SRT subtitles...")
-        create_srt(result, srt_path)
+        create_srt(result, srt_path, api_key=os.environ.get("GOOGLE_API_KEY", "key"))
+        if not media.has_video(video_path):
+            # Audio-only input: nothing to burn into, keep the subtitles next to the output instead
+            srt_out = os.path.splitext(output_path)[0] + ".srt"
+            shutil.copyfile(srt_path, srt_out)
+            print(f"No video stream, subtitles saved: {srt_out}")
+            return
         print("Burning subtitles into video...")
         burn_subtitles(video_path, srt_path, output_path)
         print(f"Done! Output video: {output_path}")
@@ -0,0 +1,206 @@
+import argparse
+import bisect
+import json
+import time
+
+import numpy as np
+
+from audio_stream import SAMPLE_RATE, stream_audio
+from model_registry import BACKENDS, DEFAULT_BACKEND, get_asr_pipeline
+from subtitle_writer import SubtitleWriter
+
+# Audio read from the source per decoding pass
+STEP_S = 2.0
+# Past this much uncommitted audio, finished cues are committed without waiting for a second pass to agree.
+# Whisper hears at most 30 s at once, so the window must stay below that.
+MAX_WINDOW_S = 20.0
+# A cue ending this close to the newest audio may still be cut off
+STABLE_MARGIN_S = 1.0
+# Cues of two passes that start this close together are the same cue
+AGREEMENT_TOLERANCE_S = 0.5
+NETWORK_SCHEMES = ("rtmp://", "rtmps://", "udp://", "rtp://", "srt://", "tcp://", "http://", "https://")
+
+
+def input_args(source, follow=False, realtime=False, idle_timeout=None):
+    """ffmpeg input options for a live source: a network stream, a growing file (follow) or a file read at 1x."""
+    args = []
+    if source.startswith(NETWORK_SCHEMES):
+        # Hand packets over as they arrive instead of buffering them for stream analysis
+        args += ['-fflags', 'nobuffer']
+    elif follow:
+        # Keep reading at the end of the file. The recording must be in a streamable container (ts, mkv),
+        # an MP4 is only readable once it is finished.
+        args += ['-follow', '1']
+    elif realtime:
+        args += ['-re']
+    if idle_timeout:
+        # Without it a followed file or a silent network source is waited on forever
+        args += ['-rw_timeout', str(int(idle_timeout * 1e6))]
+    return args
+
+
+class RollingTranscriber:
+    """
+    Re-decodes the audio after the last committed cue on every step and commits a cue once it is final:
+    two passes in a row agree on it and it ends clear of the newest audio. When the window grows past
+    max_window_s the finished cues are committed regardless, which bounds both latency and decode cost.
+    """
+
+    def __init__(self, asr, max_window_s=MAX_WINDOW_S):
+        self.asr = asr
+        self.max_window_s = max_window_s
+        self.audio = np.zeros(0, dtype=np.float32)
+        # Stream time of self.audio[0]
+        self.start = 0.0
+        self._previous = []
+
+    def _decode(self):
+        out = self.asr({"raw": self.audio, "sampling_rate": SAMPLE_RATE}, return_timestamps=True)
+        audio_end = len(self.audio) / SAMPLE_RATE
+        cues = []
+        for chunk in out['chunks']:
+            start, end = chunk['timestamp']
+            cues.append((start or 0.0, end if end is not None else audio_end, chunk['text'].strip()))
+        return cues
+
+    def _agreed(self, i, start, text):
+        if i >= len(self._previous):
+            return False
+        previous_start, _, previous_text = self._previous[i]
+        return previous_text == text and abs(previous_start - start) <= AGREEMENT_TOLERANCE_S
+
+    def feed(self, samples, final=False):
+        """Add audio; returns the cues committed by it as (start, end, text) on the stream timeline."""
+        if len(samples):
+            self.audio = np.concatenate([self.audio, samples])
+        if not len(self.audio):
+            return []
+        audio_end = len(self.audio) / SAMPLE_RATE
+        hypothesis = self._decode()
+        if final:
+            committed = hypothesis
+        else:
+            forced = audio_end > self.max_window_s
+            committed = []
+            # The last cue may still be cut off by the end of the audio
+            for i, (start, end, text) in enumerate(hypothesis[:-1]):
+                if end > audio_end - STABLE_MARGIN_S or not (forced or self._agreed(i, start, text)):
+                    break
+                committed.append((start, end, text))
+            if forced and audio_end - (committed[-1][1] if committed else 0.0) > self.max_window_s:
+                # One cue (or silence) filling the whole window: take it as it is rather than overflow Whisper
+                committed = hypothesis
+        if final:
+            cut = audio_end
+        elif committed:
+            cut = committed[-1][1]
+        elif not hypothesis and audio_end > self.max_window_s:
+            # Nothing was said; keep only the newest audio, which may hold the start of a word
+            cut = audio_end - STABLE_MARGIN_S
+        else:
+            cut = 0.0
+        offset = self.start
+        if cut:
+            self.audio = self.audio[int(cut * SAMPLE_RATE):].copy()
+            self.start += cut
+        self._previous = [(start - cut, end - cut, text) for start, end, text in hypothesis[len(committed):]]
+        return [(offset + start, offset + end, text) for start, end, text in committed]
+
+
+def latency_report(latencies, audio_seconds, decode_seconds):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else None
+
+    return {
+        "cues": len(ordered),
+        "audio_seconds": round(audio_seconds, 3),
+        "decode_seconds": round(decode_seconds, 3),
+        "real_time_factor": round(decode_seconds / audio_seconds, 4) if audio_seconds else None,
+        "latency_mean": round(sum(ordered) / len(ordered), 3) if ordered else None,
+        "latency_p50": percentile(0.5),
+        "latency_p95": percentile(0.95),
+        "latency_max": round(ordered[-1], 3) if ordered else None,
+    }
+
+
+def run_live(source, model_dir, srt_path, vtt_path=None, task="transcribe", backend=DEFAULT_BACKEND, step_s=STEP_S,
+             max_window_s=MAX_WINDOW_S, follow=False, realtime=False, idle_timeout=None, report_path=None):
+    """
+    Caption a live source into SRT (and WebVTT) files that grow cue by cue, flushed as each cue is committed.
+    A cue's latency is the time from the arrival of the audio holding its end to the cue being written.
+    """
+    asr = get_asr_pipeline(model_dir, task=task, language="he", backend=backend)
+    transcriber = RollingTranscriber(asr, max_window_s=max_window_s)
+    writers = [SubtitleWriter(path) for path in (srt_path, vtt_path) if path]
+    # Stream time heard so far and the wall clock time it arrived, one entry per step
+    heard, arrived = [], []
+    latencies = []
+    decode_seconds = 0.0
+
+    def emit(cues):
+        now = time.time()
+        for start, end, text in cues:
+            for writer in writers:
+                writer.write(start, end, text)
+            i = min(bisect.bisect_left(heard, end), len(heard) - 1)
+            latencies.append(now - arrived[i])
+            print(f"[{start:8.2f} --> {end:8.2f}] +{latencies[-1]:.1f}s {text}")
+        for writer in writers:
+            writer.flush()
+        # Entries before the uncommitted audio are no longer needed
+        keep = max(0, bisect.bisect_left(heard, transcriber.start) - 1)
+        del heard[:keep], arrived[:keep]
+
+    print(f"Captioning {source} in {step_s:g}s steps...")
+    try:
+        try:
+            for block_start, samples in stream_audio(source, block_seconds=step_s,
+                                                     input_args=input_args(source, follow, realtime, idle_timeout)):
+                heard.append(block_start + len(samples) / SAMPLE_RATE)
+                arrived.append(time.time())
+                started = time.perf_counter()
+                cues = transcriber.feed(samples)
+                decode_seconds += time.perf_counter() - started
+                emit(cues)
+        except KeyboardInterrupt:
+            print("Stopped, committing what was heard so far")
+        if heard:
+            emit(transcriber.feed(np.zeros(0, dtype=np.float32), final=True))
+    finally:
+        for writer in writers:
+            writer.close()
+    report = latency_report(latencies, heard[-1] if heard else 0.0, decode_seconds)
+    print(f"{report['cues']} cues, caption latency mean {report['latency_mean']}s, p95 {report['latency_p95']}s, "
+          f"max {report['latency_max']}s, decoding at {report['real_time_factor']}x real time")
+    if report['real_time_factor'] and report['real_time_factor'] > 1:
+        print("Decoding is slower than real time: latency grows with the stream. Try a faster --backend.")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(dict(report, source=source, step_s=step_s, max_window_s=max_window_s), f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Live subtitles from a stream or a file that is still being written.",
+        epilog="Local test stream: ffmpeg -re -i talk.mp4 -c copy -f mpegts udp://127.0.0.1:1234 and "
+               "python live.py udp://127.0.0.1:1234 MODEL_DIR live.srt --vtt live.vtt")
+    parser.add_argument("source", help="rtmp://, udp://, srt:// ... URL, or a file (see --follow / --realtime)")
+    parser.add_argument("model_dir")
+    parser.add_argument("srt", help="SRT file written cue by cue")
+    parser.add_argument("--vtt", help="also write a WebVTT file")
+    parser.add_argument("--task", default="transcribe", choices=["transcribe", "translate"])
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--step", type=float, default=STEP_S, help="seconds of audio per decoding pass")
+    parser.add_argument("--max-window", type=float, default=MAX_WINDOW_S,
+                        help="uncommitted audio after which cues are committed without agreement")
+    parser.add_argument("--follow", action="store_true", help="the file is still being written, keep reading it")
+    parser.add_argument("--realtime", action="store_true", help="read a finished file at 1x, like a live source")
+    parser.add_argument("--idle-timeout", type=float, help="stop after this many seconds without new data")
+    parser.add_argument("--report", help="write the latency report as JSON")
+    args = parser.parse_args()
+    run_live(args.source, args.model_dir, args.srt, vtt_path=args.vtt, task=args.task, backend=args.backend,
+             step_s=args.step, max_window_s=args.max_window, follow=args.follow, realtime=args.realtime,
+             idle_timeout=args.idle_timeout, report_path=args.report)
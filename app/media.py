@@ -0,0 +1,137 @@
+import functools
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_RATE = 16000
+# ffmpeg processes run at once by this process; 0 means one per core. Extractions and stream copies keep about
+# one core busy each. Encodes are multi-threaded, so the ones burn.py runs side by side divide the cores
+# between them rather than each taking them all.
+FFMPEG_WORKERS = int(os.environ.get("SUBS_FFMPEG_WORKERS", "0")) or os.cpu_count() or 1
+# Container language tags are ISO 639-2; the pipeline speaks ISO 639-1.
+LANGUAGE_CODES = {"he": "heb", "en": "eng", "ru": "rus", "uk": "ukr", "ar": "ara", "am": "amh", "fr": "fre",
+                  "de": "ger", "es": "spa"}
+# Audio codecs an MP4 file can carry as they are
+MP4_AUDIO_CODECS = {"aac", "mp3", "ac3", "eac3", "alac", "opus", "flac"}
+
+_ffmpeg_slots = threading.BoundedSemaphore(FFMPEG_WORKERS)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ffmpeg_slot():
+    """Held while an ffmpeg process runs; blocks while FFMPEG_WORKERS of them are running already."""
+    return _ffmpeg_slots
+
+
+def run_ffmpeg(cmd, **kwargs):
+    with _ffmpeg_slots:
+        return subprocess.run(cmd, check=True, **kwargs)
+
+
+def ffmpeg_pool():
+    """Shared thread pool for ffmpeg jobs that can run side by side."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=FFMPEG_WORKERS, thread_name_prefix="ffmpeg")
+        return _pool
+
+
+@functools.lru_cache(maxsize=256)
+def _probe(path, size, mtime_ns):
+    out = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries',
+         'format=format_name,duration:stream=index,codec_type,codec_name,sample_rate,channels:'
+         'stream_disposition=default,attached_pic:stream_tags=language', '-of', 'json', path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    data = json.loads(out or "{}")
+    info = {
+        "format": data.get("format", {}).get("format_name", ""),
+        "duration": float(data.get("format", {}).get("duration", 0) or 0),
+        "video": None,
+        "audio": [],
+    }
+    for stream in data.get("streams", []):
+        disposition = stream.get("disposition", {})
+        if stream.get("codec_type") == "video" and not disposition.get("attached_pic") and info["video"] is None:
+            # Cover art in audio files shows up as a one-frame video stream; it is not something to burn into
+            info["video"] = {"index": stream["index"], "codec": stream.get("codec_name")}
+        elif stream.get("codec_type") == "audio":
+            info["audio"].append({
+                "index": stream["index"],
+                "codec": stream.get("codec_name"),
+                "sample_rate": int(stream.get("sample_rate") or 0),
+                "channels": int(stream.get("channels") or 0),
+                "language": stream.get("tags", {}).get("language"),
+                "default": bool(disposition.get("default")),
+            })
+    return info
+
+
+def probe(path):
+    """
+    Format, duration, the video stream (None for audio-only input) and the audio streams of a media file,
+    from one ffprobe run. Cached per file until it changes on disk; treat the result as read-only.
+    """
+    stat = os.stat(path)
+    return _probe(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def has_video(path):
+    return probe(path)["video"] is not None
+
+
+def output_extension(path):
+    """
+    Container for a burned copy of path, whose audio is stream-copied: .mp4, or .mkv when an audio codec
+    (Vorbis in .webm/.mkv, PCM ...) cannot go into MP4.
+    """
+    codecs = {track["codec"] for track in probe(path)["audio"]}
+    return ".mp4" if codecs <= MP4_AUDIO_CODECS else ".mkv"
+
+
+def select_audio_track(info, language=None):
+    """The audio stream to transcribe: one tagged with language, else the default one, else the first."""
+    tracks = info["audio"]
+    if not tracks:
+        return None
+    if language:
+        codes = {language, LANGUAGE_CODES.get(language, language)}
+        for track in tracks:
+            if track["language"] in codes:
+                return track
+    return next((track for track in tracks if track["default"]), tracks[0])
+
+
+def _asr_ready(track):
+    return track["codec"] == "pcm_s16le" and track["sample_rate"] == SAMPLE_RATE and track["channels"] == 1
+
+
+def extract_audio(video_path, audio_path, language=None):
+    """
+    Write the 16 kHz mono 16-bit WAV the models read, the cheapest way the input allows: a WAV that already
+    is one is copied, 16 kHz mono PCM in another container is stream-copied, anything else is resampled.
+    """
+    info = probe(video_path)
+    track = select_audio_track(info, language)
+    if track is None:
+        raise ValueError(f"{video_path}: no audio stream")
+    if len(info["audio"]) > 1:
+        print(f"{len(info['audio'])} audio tracks, using stream {track['index']}"
+              f"{' (' + track['language'] + ')' if track['language'] else ''}")
+    if _asr_ready(track) and info["format"] == "wav" and len(info["audio"]) == 1:
+        if not (os.path.exists(audio_path) and os.path.samefile(video_path, audio_path)):
+            shutil.copyfile(video_path, audio_path)
+        return audio_path
+    cmd = ['ffmpeg', '-y', '-nostdin', '-loglevel', 'error', '-i', video_path, '-map', f"0:{track['index']}"]
+    if _asr_ready(track):
+        cmd += ['-c:a', 'copy']
+    else:
+        cmd += ['-ar', str(SAMPLE_RATE), '-ac', '1', '-c:a', 'pcm_s16le']
+    run_ffmpeg(cmd + [audio_path])
+    return audio_path
@@ -0,0 +1,138 @@
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import wave
+from contextlib import contextmanager
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_BLOCK_SIZE = 512
+
+
+def wav_duration(audio_path):
+    with wave.open(audio_path, "rb") as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def _usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "cpu": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "rss": own.ru_maxrss * _RSS_UNIT,
+        "children_rss": children.ru_maxrss * _RSS_UNIT,
+        "read": (own.ru_inblock + children.ru_inblock) * _BLOCK_SIZE,
+        "written": (own.ru_oublock + children.ru_oublock) * _BLOCK_SIZE,
+    }
+
+
+def _reset_peak_rss():
+    """Restart the kernel's RSS high-water mark (VmHWM) of this process; False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class Metrics:
+    """
+    Per-stage wall/CPU time, peak RSS and block I/O, including ffmpeg child processes.
+    peak_rss_mb is the peak during the stage, recorded on Linux only (the high-water mark is reset when the
+    stage starts); an ffmpeg child counts when it set a new high for the children. process_peak_rss_mb is the
+    peak since the process started, on every platform.
+    Records go to a JSON lines file, or a Prometheus text file when the path ends in .prom.
+    """
+
+    def __init__(self, path=None, profile_dir=None, job=None):
+        self.path = path
+        self.profile_dir = profile_dir
+        self.job = job
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, audio_seconds=None, **labels):
+        record = {"stage": name, "job": self.job, **labels}
+        before = _usage()
+        stage_peak = _reset_peak_rss()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - started
+            after = _usage()
+            record.update(
+                wall_seconds=round(wall, 3),
+                cpu_seconds=round(after["cpu"] - before["cpu"], 3),
+                process_peak_rss_mb=round(max(after["rss"], after["children_rss"]) / 1024 / 1024, 1),
+                bytes_read=after["read"] - before["read"],
+                bytes_written=after["written"] - before["written"],
+            )
+            if stage_peak:
+                peak = _peak_rss()
+                if after["children_rss"] > before["children_rss"]:
+                    peak = max(peak, after["children_rss"])
+                record["peak_rss_mb"] = round(peak / 1024 / 1024, 1)
+            # The caller may fill in audio_seconds inside the block when it only knows it afterwards
+            audio_seconds = record.get("audio_seconds", audio_seconds)
+            if audio_seconds:
+                record["audio_seconds"] = round(audio_seconds, 3)
+                record["real_time_factor"] = round(wall / audio_seconds, 4)
+            self.records.append(record)
+            if self.path and not self.path.endswith(".prom"):
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def profile(self, name):
+        if not self.profile_dir:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            prof_path = os.path.join(self.profile_dir, f"{self.job or 'job'}_{name}.prof")
+            profiler.dump_stats(prof_path)
+            print(f"Profile written: {prof_path}")
+
+    def write_prometheus(self, path):
+        fields = ["wall_seconds", "cpu_seconds", "peak_rss_mb", "process_peak_rss_mb", "bytes_read", "bytes_written", "real_time_factor",
+                  "encode_fps"]
+        lines = []
+        for field in fields:
+            lines.append(f"# TYPE subs_stage_{field} gauge")
+            for record in self.records:
+                if field not in record:
+                    continue
+                labels = {k: v for k, v in record.items() if k not in fields and k != "audio_seconds" and v is not None}
+                label_text = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels.items())
+                lines.append(f"subs_stage_{field}{{{label_text}}} {record[field]}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def finish(self):
+        if self.path and self.path.endswith(".prom"):
+            self.write_prometheus(self.path)
+        for record in self.records:
+            rtf = f", RTF {record['real_time_factor']}" if "real_time_factor" in record else ""
+            rtf += f", {record['encode_fps']} encode fps" if "encode_fps" in record else ""
+            label = record["stage"] + (f" ({record['language']})" if record.get("language") else "")
+            rss = f"{record['peak_rss_mb']} MB peak RSS" if "peak_rss_mb" in record else \
+                f"{record['process_peak_rss_mb']} MB process peak RSS"
+            print(f"{label}: {record['wall_seconds']}s wall, {record['cpu_seconds']}s CPU, {rss}{rtf}")
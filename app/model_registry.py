@@ -0,0 +1,221 @@
+import gc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Memory budget for resident models, in MB. 0 means no limit.
+DEFAULT_BUDGET_MB = float(os.environ.get("SUBS_MODEL_BUDGET_MB", "0"))
+# fp32: checkpoint as is. int8: dynamic int8 quantization of the Linear layers (CPU).
+# bf16: bfloat16 weights where the CPU has native support. ct2: faster-whisper on local CTranslate2 weights.
+BACKENDS = ("fp32", "int8", "bf16", "ct2")
+DEFAULT_BACKEND = os.environ.get("SUBS_ASR_BACKEND", "fp32")
+
+
+def model_size_bytes(model, quantized=False):
+    if quantized:
+        # Packed int8 weights are no longer parameters; measure the serialized state dict instead
+        import io
+        import torch
+        buffer = io.BytesIO()
+        torch.save(model.state_dict(), buffer)
+        return buffer.tell()
+    size = sum(p.numel() * p.element_size() for p in model.parameters())
+    size += sum(b.numel() * b.element_size() for b in model.buffers())
+    return size
+
+
+def cpu_supports_bf16():
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        # Not Linux; Apple silicon has bf16 arithmetic, x86 Macs do not
+        import platform
+        return platform.machine() == "arm64"
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _checkpoint_num_beams(model_dir):
+    # The transformers backends decode with the checkpoint's generation config, greedy unless it says otherwise
+    try:
+        with open(os.path.join(model_dir, "generation_config.json"), encoding="utf-8") as f:
+            return int(json.load(f).get("num_beams") or 1)
+    except (OSError, ValueError):
+        return 1
+
+
+def _load_ct2_pipeline(model_dir, task, language, device):
+    from ct2_backend import CT2WhisperPipeline, find_ct2_weights
+    weights_dir = find_ct2_weights(model_dir)
+    if weights_dir is None:
+        raise RuntimeError(f"no CTranslate2 weights for {model_dir} (expected model.bin in it, in ct2/ "
+                           f"or in {model_dir}-ct2)")
+    try:
+        asr = CT2WhisperPipeline(weights_dir, task=task, language=language,
+                                 device=device if device in ("cpu", "cuda") else "cpu",
+                                 beam_size=_checkpoint_num_beams(model_dir))
+    except ImportError:
+        raise RuntimeError("the ct2 backend needs the faster-whisper package") from None
+    return asr, asr.size_bytes()
+
+
+def load_asr_pipeline(model_dir, task="transcribe", language="he", device=None, dtype=None,
+                      backend=DEFAULT_BACKEND, assistant_dir=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown ASR backend {backend}, expected one of {', '.join(BACKENDS)}")
+    if backend == "ct2":
+        if assistant_dir:
+            raise ValueError("an assistant model needs a transformers backend, not ct2")
+        return _load_ct2_pipeline(model_dir, task, language, device)
+    # transformers pulls in torch: several seconds, only paid once a model is actually loaded
+    from transformers import pipeline, WhisperForConditionalGeneration, AutoTokenizer, AutoFeatureExtractor, GenerationConfig
+    if backend == "bf16":
+        import torch
+        if cpu_supports_bf16() or device not in (None, "cpu"):
+            dtype = torch.bfloat16
+        else:
+            print("This CPU has no native bf16, loading the model in fp32")
+    model_kwargs = {"local_files_only": True}
+    if dtype is not None:
+        model_kwargs["torch_dtype"] = dtype
+    model = WhisperForConditionalGeneration.from_pretrained(model_dir, **model_kwargs)
+    if backend == "int8":
+        import torch
+        # Weights of every Linear layer stored as int8, activations quantized on the fly; CPU only
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        device = "cpu"
+    generate_kwargs = {"task": task}
+    assistant = None
+    if assistant_dir:
+        # The small model drafts tokens and the large one verifies them in a single forward pass.
+        # With greedy decoding the output is the same as the large model on its own.
+        assistant = WhisperForConditionalGeneration.from_pretrained(assistant_dir, **model_kwargs)
+        if assistant.config.vocab_size != model.config.vocab_size:
+            raise ValueError(f"assistant {assistant_dir} has a different vocabulary than {model_dir}")
+        generate_kwargs.update(assistant_model=assistant, num_beams=1, do_sample=False)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+    feature_extractor = AutoFeatureExtractor.from_pretrained(model_dir, local_files_only=True)
+    if not hasattr(model, "generation_config") or model.generation_config is None:
+        model.generation_config = GenerationConfig.from_pretrained(model_dir, local_files_only=True)
+    if getattr(model.generation_config, "no_timestamps_token_id", None) is None:
+        model.generation_config.no_timestamps_token_id = tokenizer.convert_tokens_to_ids("<|notimestamps|>")
+    if getattr(model.generation_config, "task", None) is None:
+        model.generation_config.task = task
+    if getattr(model.generation_config, "language", None) is None:
+        model.generation_config.language = language
+    asr = pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=tokenizer,
+        feature_extractor=feature_extractor,
+        generate_kwargs=generate_kwargs,
+        device=device,
+        torch_dtype=dtype
+    )
+    if assistant is not None:
+        assistant.to(asr.device)
+    size = model_size_bytes(model, quantized=backend == "int8")
+    return asr, size + (model_size_bytes(assistant) if assistant is not None else 0)
+
+
+class ModelRegistry:
+    """Keeps loaded ASR pipelines around and evicts the least recently used ones over the memory budget."""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key being loaded: a load takes seconds and must not hold up hits on other models
+        self._loading = {}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+        return entry
+
+    def get(self, model_dir, task="transcribe", language="he", device=None, dtype=None, backend=DEFAULT_BACKEND,
+            assistant_dir=None):
+        backend = backend or DEFAULT_BACKEND
+        assistant_dir = os.path.abspath(assistant_dir) if assistant_dir else None
+        key = (os.path.abspath(model_dir), task, language, device, str(dtype) if dtype is not None else None, backend,
+               assistant_dir)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry["asr"]
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            # Another thread may have loaded it while this one waited
+            with self._lock:
+                entry = self._lookup(key)
+            if entry is not None:
+                return entry["asr"]
+            try:
+                started = time.perf_counter()
+                asr, size = load_asr_pipeline(model_dir, task=task, language=language, device=device, dtype=dtype,
+                                              backend=backend, assistant_dir=assistant_dir)
+                load_seconds = time.perf_counter() - started
+                print(f"Loaded model {model_dir} ({task}, {language}, {backend}) in {load_seconds:.1f}s, "
+                      f"{size / 1024 / 1024:.0f} MB resident")
+                with self._lock:
+                    self._entries[key] = {"asr": asr, "size": size, "load_seconds": load_seconds, "hits": 0}
+                    self._evict()
+                return asr
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def resident_bytes(self):
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def _evict(self):
+        evicted = False
+        # Never evict the entry that was just loaded, even if it alone is over budget.
+        while self.budget_bytes and self.resident_bytes() > self.budget_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            print(f"Evicting model {key[0]} ({key[1]}, {key[2]}), {entry['size'] / 1024 / 1024:.0f} MB")
+            evicted = True
+        if evicted:
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        gc.collect()
+
+    def report(self):
+        with self._lock:
+            return [
+                {
+                    "model_dir": key[0],
+                    "task": key[1],
+                    "language": key[2],
+                    "device": key[3],
+                    "dtype": key[4],
+                    "backend": key[5],
+                    "assistant": key[6],
+                    "load_seconds": round(entry["load_seconds"], 3),
+                    "size_mb": round(entry["size"] / 1024 / 1024, 1),
+                    "hits": entry["hits"],
+                }
+                for key, entry in self._entries.items()
+            ]
+
+
+registry = ModelRegistry()
+
+
+def get_asr_pipeline(model_dir, task="transcribe", language="he", device=None, dtype=None, backend=DEFAULT_BACKEND,
+                     assistant_dir=None):
+    return registry.get(model_dir, task=task, language=language, device=device, dtype=dtype, backend=backend,
+                        assistant_dir=assistant_dir)
@@ -0,0 +1,133 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pcm_source import SAMPLE_RATE, PcmSource, split_windows
+
+WINDOW_S = 120
+OVERLAP_S = 15
+# Chunks from neighbouring windows that start this close to the end of an already kept chunk are duplicates.
+DEDUP_TOLERANCE_S = 0.5
+# A chunk ending this close to its window end may have been cut off by the window.
+EDGE_GUARD_S = 1.0
+
+_worker_asr = None
+
+
+def _init_worker(model_dir, task, language, threads, backend, assistant_dir):
+    global _worker_asr
+    import torch
+    torch.set_num_threads(threads)
+    from model_registry import get_asr_pipeline
+    _worker_asr = get_asr_pipeline(model_dir, task=task, language=language, backend=backend,
+                                   assistant_dir=assistant_dir)
+
+
+def _read_window(audio_path, start, end):
+    with PcmSource(audio_path) as source:
+        return source.float_window(start, end)
+
+
+def transcribe_window(asr, audio_path, start, end):
+    samples = _read_window(audio_path, start, end)
+    out = asr({"raw": samples, "sampling_rate": SAMPLE_RATE}, return_timestamps=True)
+    offset = start / SAMPLE_RATE
+    window_end = end / SAMPLE_RATE
+    chunks = []
+    for chunk in out['chunks']:
+        chunk_start, chunk_end = chunk['timestamp']
+        chunks.append({
+            'timestamp': (offset + (chunk_start or 0.0), offset + chunk_end if chunk_end is not None else window_end),
+            'text': chunk['text'],
+        })
+    return chunks
+
+
+def _transcribe_window(audio_path, start, end):
+    return transcribe_window(_worker_asr, audio_path, start, end)
+
+
+def merge_windows(window_chunks, windows):
+    """Stitch per-window chunk lists (already on the absolute timeline) into one list without overlap repeats."""
+    merged = []
+    for i, chunks in enumerate(window_chunks):
+        window_end = windows[i][1] / SAMPLE_RATE
+        next_start = windows[i + 1][0] / SAMPLE_RATE if i + 1 < len(windows) else None
+        for chunk in chunks:
+            start, end = chunk['timestamp']
+            if merged and start < merged[-1]['timestamp'][1] - DEDUP_TOLERANCE_S:
+                continue
+            if next_start is not None and end > window_end - EDGE_GUARD_S and start >= next_start:
+                # Possibly cut off by the window end; the next window heard all of it and supplies it instead.
+                # One that starts before the next window is kept: only this window heard its beginning, and
+                # the next window's chunks up to its end are dropped as repeats.
+                break
+            merged.append(chunk)
+    return merged
+
+
+def _window_checkpoint(checkpoint_dir, index):
+    return os.path.join(checkpoint_dir, f"window_{index:05d}.json")
+
+
+def _load_window(checkpoint_dir, index):
+    try:
+        with open(_window_checkpoint(checkpoint_dir, index), encoding="utf-8") as f:
+            return [{'timestamp': tuple(chunk['timestamp']), 'text': chunk['text']} for chunk in json.load(f)]
+    except (OSError, ValueError):
+        return None
+
+
+def _save_window(checkpoint_dir, index, chunks):
+    path = _window_checkpoint(checkpoint_dir, index)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(chunks, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def transcribe_parallel(audio_path, model_dir, task="transcribe", language="he", workers=None,
+                        threads_per_worker=2, window_s=WINDOW_S, overlap_s=OVERLAP_S, checkpoint_dir=None,
+                        backend=None, assistant_dir=None):
+    """
+    Transcribe overlapping windows and stitch them. workers=None uses every core, workers=0 runs the windows
+    one after another in this process. With checkpoint_dir every finished window is saved there and
+    skipped on the next run, so an interrupted transcription resumes at the first missing window.
+    """
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    with PcmSource(audio_path) as source:
+        n_samples = len(source)
+    windows = split_windows(n_samples, window_s=window_s, overlap_s=overlap_s)
+    window_chunks = [None] * len(windows)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        window_chunks = [_load_window(checkpoint_dir, i) for i in range(len(windows))]
+    pending = [i for i, chunks in enumerate(window_chunks) if chunks is None]
+    if len(pending) < len(windows):
+        print(f"Resuming: {len(windows) - len(pending)} of {len(windows)} windows already transcribed")
+
+    def done(index, chunks):
+        window_chunks[index] = chunks
+        if checkpoint_dir:
+            _save_window(checkpoint_dir, index, chunks)
+
+    if pending and workers:
+        workers = min(workers, len(pending))
+        print(f"Transcribing {len(pending)} windows with {workers} workers x {threads_per_worker} threads")
+        # spawn, not fork: torch thread pools do not survive a fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(model_dir, task, language, threads_per_worker, backend,
+                                           assistant_dir)) as pool:
+            futures = {pool.submit(_transcribe_window, audio_path, *windows[i]): i for i in pending}
+            for future in as_completed(futures):
+                done(futures[future], future.result())
+    elif pending:
+        from model_registry import get_asr_pipeline
+        asr = get_asr_pipeline(model_dir, task=task, language=language, backend=backend, assistant_dir=assistant_dir)
+        for i in pending:
+            print(f"Transcribing window {i + 1}/{len(windows)}")
+            done(i, transcribe_window(asr, audio_path, *windows[i]))
+    chunks = merge_windows(window_chunks, windows)
+    return {"text": "".join(chunk['text'] for chunk in chunks), "chunks": chunks}
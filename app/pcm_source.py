@@ -0,0 +1,97 @@
+import struct
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _read_header(path):
+    """(channels, sample_rate, bits, data offset, data size) of a PCM WAV file."""
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError(f"{path}: not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no data chunk")
+            chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(size - 16 + (size & 1), 1)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path}: data chunk before fmt chunk")
+                format_tag, channels, sample_rate, _, _, bits = fmt
+                if format_tag not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_EXTENSIBLE):
+                    raise ValueError(f"{path}: not PCM")
+                return channels, sample_rate, bits, f.tell(), size
+            else:
+                f.seek(size + (size & 1), 1)
+
+
+def split_windows(n_samples, window_s, overlap_s, sample_rate=SAMPLE_RATE):
+    """(start, end) sample ranges of overlapping windows covering n_samples."""
+    window = int(window_s * sample_rate)
+    step = window - int(overlap_s * sample_rate)
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window, n_samples)
+        windows.append((start, end))
+        if end >= n_samples:
+            return windows
+        start += step
+
+
+class PcmSource:
+    """
+    Read-only memory map of the int16 samples of an extracted 16-bit mono WAV.
+    Windows are views into the map; only float_window() converts, and only the requested range, so memory
+    use stays at a window or two however long the recording is.
+    """
+
+    def __init__(self, path):
+        channels, sample_rate, bits, offset, size = _read_header(path)
+        if bits != 16 or channels != 1:
+            raise ValueError(f"{path}: expected 16-bit mono PCM")
+        if sample_rate != SAMPLE_RATE:
+            # Windows and timestamps are counted in 16 kHz samples; other rates would play at the wrong speed
+            raise ValueError(f"{path}: expected {SAMPLE_RATE} Hz, got {sample_rate} Hz")
+        self.path = path
+        self.sample_rate = sample_rate
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            # A header written while streaming may claim more data than the file holds
+            size = min(size, f.tell() - offset)
+        self.n_samples = size // 2
+        if self.n_samples:
+            self.samples = np.memmap(path, dtype=np.int16, mode="r", offset=offset, shape=(self.n_samples,))
+        else:
+            self.samples = np.zeros(0, dtype=np.int16)
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sample_rate
+
+    def __len__(self):
+        return self.n_samples
+
+    def window(self, start, end):
+        return self.samples[start:end]
+
+    def float_window(self, start, end):
+        return self.window(start, end).astype(np.float32) / 32768.0
+
+    def close(self):
+        # The map goes away with its last view; closing it here would break windows still in use
+        self.samples = np.zeros(0, dtype=np.int16)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
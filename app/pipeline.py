@@ -0,0 +1,115 @@
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a StagedExecutor. fn takes an item (a dict) and returns a list of items for the next stage,
+    so a stage can fan out (one file -> one item per language) or drop an item by returning [].
+    workers caps how many items the stage handles at once; queue_size bounds its input queue, so a fast
+    upstream stage blocks instead of piling up work. process=True runs fn in the shared process pool
+    (fn and the items must then be picklable).
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=2, process=False):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.process = process
+
+
+class StagedExecutor:
+    """
+    Runs items through a chain of stages connected by bounded queues, every stage with its own threads.
+    Different items are in different stages at the same time, so a batch takes about as long as its slowest
+    stage rather than the sum of all of them. An item whose stage raises is reported as failed and goes no further.
+    """
+
+    def __init__(self, stages, on_item=None):
+        self.stages = stages
+        self.on_item = on_item
+        self.finished = []
+        self.failed = []
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._alive = [stage.workers for stage in stages]
+        self._pool = None
+
+    def _report(self, item, stage, error=None):
+        with self._lock:
+            if error is None:
+                self.finished.append(item)
+            else:
+                self.failed.append((item, stage.name, error))
+        if self.on_item:
+            try:
+                self.on_item(item, stage.name, error)
+            except Exception:
+                # A failing callback must not take the worker thread (and with it the whole run) down
+                traceback.print_exc()
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(self.stages) else None
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                started = time.perf_counter()
+                try:
+                    if stage.process:
+                        outputs = self._pool.submit(stage.fn, item).result()
+                    else:
+                        outputs = stage.fn(item)
+                    seconds = round(time.perf_counter() - started, 3)
+                    for output in outputs:
+                        # Fanned-out items may share the parent's dict, so every output gets its own copy
+                        output["timings"] = {**output.get("timings", {}), stage.name: seconds}
+                        if outbox is None:
+                            self._report(output, stage)
+                        else:
+                            # Blocks while the next stage is saturated: backpressure up the chain
+                            outbox.put(output)
+                except Exception as e:
+                    self._report(item, stage, e)
+        finally:
+            # However this worker ends, the next stage must still learn that this one is done
+            with self._lock:
+                self._alive[index] -= 1
+                last = self._alive[index] == 0
+            if last and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    outbox.put(_DONE)
+
+    def run(self, items):
+        process_workers = sum(stage.workers for stage in self.stages if stage.process)
+        if process_workers:
+            # spawn, not fork: the parent may already hold torch thread pools
+            self._pool = ProcessPoolExecutor(max_workers=process_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        threads = [
+            threading.Thread(target=self._worker, args=(index,), daemon=True, name=f"{stage.name}-{n}")
+            for index, stage in enumerate(self.stages) for n in range(stage.workers)
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for item in items:
+                self._queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                self._queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+        finally:
+            if self._pool:
+                self._pool.shutdown()
+        return self.finished, self.failed
@@ -0,0 +1,91 @@
+import threading
+from contextlib import ExitStack
+
+import numpy as np
+
+from subtitle_writer import SubtitleWriter
+from translation import get_translator, translate_texts
+
+ORIGINAL = "orig"
+
+
+class SegmentTable:
+    """
+    One ASR result as columns: start/end times (NaN for an open end) and, per segment, an index into the
+    unique stripped texts. Every language is a column parallel to those unique texts, so a line Whisper
+    repeats is translated once, and each column is translated once however many files are written from it.
+    """
+
+    def __init__(self, starts, ends, text_ids, texts, source=None):
+        self.starts = starts
+        self.ends = ends
+        self.text_ids = text_ids
+        self.source = source
+        self.columns = {ORIGINAL: texts}
+        # Per translated column, how many of its texts kept the source text (errors, offline cache misses)
+        self.untranslated = {}
+        self._pivot_lock = threading.Lock()
+
+    @classmethod
+    def from_result(cls, result, source=None):
+        chunks = result['chunks']
+        starts = np.empty(len(chunks))
+        ends = np.empty(len(chunks))
+        text_ids = np.empty(len(chunks), dtype=np.int32)
+        index = {}
+        for i, chunk in enumerate(chunks):
+            start, end = chunk['timestamp']
+            starts[i] = start or 0.0
+            ends[i] = np.nan if end is None else end
+            text_ids[i] = index.setdefault(chunk['text'].strip(), len(index))
+        return cls(starts, ends, text_ids, list(index), source=source)
+
+    def __len__(self):
+        return len(self.text_ids)
+
+    @property
+    def texts(self):
+        return self.columns[ORIGINAL]
+
+    def translate(self, target, api_key=None, translator=None, pivot=None):
+        """
+        The column for target, translated in batches on first use. With a pivot language (the provider's own
+        by default, e.g. English for per-pair Marian models) the source is translated to the pivot once and
+        every other target from there.
+        """
+        if target in self.columns:
+            return self.columns[target]
+        translator = translator or get_translator(api_key=api_key)
+        pivot = translator.pivot if pivot is None else pivot
+        untranslated = set()
+        if target == self.source:
+            column = self.texts
+        elif pivot and pivot not in (self.source, target):
+            with self._pivot_lock:
+                pivot_column = self.translate(pivot, translator=translator, pivot=False)
+            column = translate_texts(pivot_column, target=target, translator=translator, source=pivot,
+                                     untranslated=untranslated)
+            # Texts that never made it to the pivot language are not really translated either
+            self.untranslated[target] = len(untranslated) + self.untranslated.get(pivot, 0)
+        else:
+            column = translate_texts(self.texts, target=target, translator=translator, source=self.source,
+                                     untranslated=untranslated)
+        self.untranslated.setdefault(target, len(untranslated))
+        self.columns[target] = column
+        return column
+
+    def complete(self, column):
+        """Whether every text of the column is translated, i.e. it can be checkpointed as done."""
+        return not self.untranslated.get(column)
+
+    def write(self, paths):
+        """Write the subtitle files {column: path} in one pass over the segments."""
+        with ExitStack() as stack:
+            outputs = [(stack.enter_context(SubtitleWriter(path)), self.columns[column])
+                       for column, path in paths.items()]
+            for start, end, text_id in zip(self.starts.tolist(), self.ends.tolist(), self.text_ids.tolist()):
+                # NaN: the ASR left the end open, the writer closes it at the next cue
+                end = None if end != end else end
+                for writer, column in outputs:
+                    writer.write(start, end, column[text_id])
+        return paths
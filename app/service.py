@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import queue
+import socketserver
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asr_cache import cached_asr
+from burn import BURN_PROFILES, DEFAULT_PROFILE, burn_subtitles_multi, mux_soft_subtitles
+from media import has_video
+from model_registry import DEFAULT_BACKEND, get_asr_pipeline, registry
+from segments import SegmentTable
+from translation_cache import get_cache
+from transcription_multy import (extract_audio, transcribe_audio, transcription_key, languages_order,
+                                 source_language)
+
+MODES = ("burn", "soft", "none")
+TASKS = ("transcribe", "translate")
+DEFAULT_QUEUE_SIZE = 100
+
+
+class JobQueue:
+    """Bounded job queue worked off by a fixed pool of threads sharing the process-wide model registry."""
+
+    def __init__(self, model_dir, workers=2, max_queued=DEFAULT_QUEUE_SIZE, api_key=None):
+        self.model_dir = model_dir
+        self.api_key = api_key
+        self.jobs = {}
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        # One ASR at a time per loaded pipeline; translation and burning of other jobs keep running meanwhile.
+        self._asr_locks = {}
+        self._threads = [threading.Thread(target=self._work, daemon=True, name=f"worker-{i}") for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("job must be a JSON object")
+        for field in ("video", "mode", "profile", "task", "output", "model_dir"):
+            if spec.get(field) is not None and not isinstance(spec[field], str):
+                raise ValueError(f"{field} must be a string")
+        video = spec.get("video")
+        if not video or not os.path.isfile(video):
+            raise ValueError(f"video not found: {video}")
+        mode = spec.get("mode", "burn")
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        profile = spec.get("profile", DEFAULT_PROFILE)
+        if profile not in BURN_PROFILES:
+            raise ValueError(f"profile must be one of {', '.join(BURN_PROFILES)}")
+        task = spec.get("task", "transcribe")
+        if task not in TASKS:
+            raise ValueError(f"task must be one of {', '.join(TASKS)}")
+        languages = spec.get("languages", [])
+        if not isinstance(languages, list) or not all(isinstance(lang, str) for lang in languages):
+            raise ValueError("languages must be a list of language codes")
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "video": video,
+            "output": spec.get("output") or os.path.splitext(video)[0] + "_subs.mp4",
+            "task": task,
+            "languages": languages,
+            "mode": mode,
+            "profile": profile,
+            "model_dir": spec.get("model_dir") or self.model_dir,
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "submitted": time.time(),
+        }
+        with self._lock:
+            self.jobs[job["id"]] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self.jobs[job["id"]]
+            raise
+        return job
+
+    def queued(self):
+        return self._queue.qsize()
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _asr_lock(self, key):
+        with self._lock:
+            return self._asr_locks.setdefault(key, threading.Lock())
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            self._update(job, status="running", started=time.time())
+            try:
+                outputs = self._run(job)
+                self._update(job, status="done", stage=None, progress=1.0, outputs=outputs)
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job, status="failed", error=str(e))
+            finally:
+                self._update(job, finished=time.time())
+                self._queue.task_done()
+
+    def _run(self, job):
+        video_path, model_dir, task = job["video"], job["model_dir"], job["task"]
+        base = os.path.splitext(job["output"])[0]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self._update(job, stage="extracting", progress=0.05)
+            audio_path = os.path.join(tmpdir, "audio.wav")
+            extract_audio(video_path, audio_path, language="he" if task == "transcribe" else None)
+
+            self._update(job, stage="transcribing", progress=0.15)
+            key = transcription_key(audio_path, model_dir, task=task, backend=DEFAULT_BACKEND)
+            with self._asr_lock((os.path.abspath(model_dir), task)):
+                result, cache_hit = cached_asr(key, lambda: transcribe_audio(audio_path, model_dir, task=task))
+            self._update(job, asr_cache_hit=cache_hit)
+
+            srt_paths = {"orig": base + "_orig.srt"}
+            table = SegmentTable.from_result(result, source=source_language(task))
+            for i, lang in enumerate(job["languages"]):
+                self._update(job, stage=f"translating {lang}", progress=0.6 + 0.2 * i / len(job["languages"]))
+                srt_paths[lang] = base + f"_{lang}.srt"
+                table.translate(lang, api_key=self.api_key)
+            table.write(srt_paths)
+            outputs = {"srt": srt_paths}
+
+            if job["mode"] == "soft":
+                self._update(job, stage="muxing", progress=0.8)
+                outputs["video"] = job["output"]
+                mux_soft_subtitles(video_path, [(lang, srt_paths[lang]) for lang in languages_order(srt_paths)],
+                                   job["output"])
+            elif job["mode"] == "burn" and not has_video(video_path):
+                outputs["videos"] = {}
+            elif job["mode"] == "burn":
+                self._update(job, stage="burning", progress=0.8)
+                outputs["videos"] = {lang: base + f"_{lang}.mp4" for lang in languages_order(srt_paths)}
+                stats = burn_subtitles_multi(video_path, [(srt_paths[lang], outputs["videos"][lang])
+                                                          for lang in languages_order(srt_paths)],
+                                             profile=job["profile"])
+                outputs["encode_fps"] = stats["fps"]
+        return outputs
+
+    def snapshot(self, job_id=None):
+        with self._lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return dict(job) if job else None
+            return [dict(job) for job in self.jobs.values()]
+
+
+class Handler(BaseHTTPRequestHandler):
+    jobs = None
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if parts == ["health"]:
+            cache = get_cache()
+            self._send(200, {"queued": self.jobs.queued(), "models": registry.report(),
+                             "translation_cache": cache.stats() if cache else None})
+        elif parts == ["jobs"]:
+            self._send(200, self.jobs.snapshot())
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self.jobs.snapshot(parts[1])
+            if job:
+                self._send(200, job)
+            else:
+                self._send(404, {"error": "no such job"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = self.jobs.submit(json.loads(self.rfile.read(length) or b"{}"))
+        except queue.Full:
+            self._send(503, {"error": "queue is full"})
+            return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(202, {"id": job["id"], "status": job["status"]})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(model_dir, host="127.0.0.1", port=8765, socket_path=None, workers=2, max_queued=DEFAULT_QUEUE_SIZE,
+          api_key=None, preload_tasks=("transcribe",)):
+    jobs = JobQueue(model_dir, workers=workers, max_queued=max_queued, api_key=api_key)
+    # Warm the model before accepting work so the first job does not pay the load.
+    for task in preload_tasks:
+        get_asr_pipeline(model_dir, task=task, language="he")
+    handler = type("JobHandler", (Handler,), {"jobs": jobs})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        print(f"Listening on unix socket {socket_path} with {workers} workers")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        print(f"Listening on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Subtitle job service with resident models.")
+    parser.add_argument("model_dir")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on a unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=2, help="jobs processed concurrently")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--preload", nargs="*", default=["transcribe"], help="tasks to load models for at startup")
+    args = parser.parse_args()
+    GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "key")
+    serve(args.model_dir, host=args.host, port=args.port, socket_path=args.socket, workers=args.workers,
+          max_queued=args.max_queued, api_key=GOOGLE_API_KEY, preload_tasks=args.preload)
@@ -0,0 +1,229 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Only argparse and the light burn/model_registry constants are imported up front. Every subcommand imports
+# what it needs when it runs, so usage, argument errors, burning and translation-only jobs never load torch.
+from burn import BURN_PROFILES, DEFAULT_PROFILE
+from model_registry import BACKENDS, DEFAULT_BACKEND
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Start-up import time allowed for `subs.py --help`
+STARTUP_BUDGET_MS = float(os.environ.get("SUBS_STARTUP_BUDGET_MS", "300"))
+HEAVY_MODULES = ("torch", "transformers", "whisper", "faster_whisper")
+# What each subcommand imports once it runs; `startup` times these
+COMMAND_IMPORTS = {
+    "extract": ["transcription_multy"],
+    "transcribe": ["transcription_multy", "asr_cache"],
+    "translate": ["transcription_multy", "burn"],
+    "burn": ["burn", "media"],
+    "all": ["transcription_multy"],
+}
+
+
+def _stem(path):
+    return os.path.splitext(path)[0]
+
+
+def cmd_extract(args):
+    from transcription_multy import extract_audio
+    output = args.output or _stem(args.video) + ".wav"
+    extract_audio(args.video, output)
+    print(f"Audio written: {output}")
+
+
+def cmd_transcribe(args):
+    import json
+    import tempfile
+    from asr_cache import cached_asr
+    from transcription_multy import create_srt, extract_audio, transcribe_audio, transcription_key
+    base = _stem(args.output or args.input)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # A WAV that already is 16 kHz mono PCM is just copied; any other one is resampled like a video's audio
+        audio_path = os.path.join(tmpdir, "audio.wav")
+        print("Extracting audio...")
+        extract_audio(args.input, audio_path, language="he" if args.task == "transcribe" else None)
+        print(f"Transcribing ({'transcribe' if args.task == 'transcribe' else 'translate to English'})...")
+        key = transcription_key(audio_path, args.model_dir, task=args.task, vad=args.vad, windowed=bool(args.workers),
+                                backend=args.backend, assistant_dir=args.assistant)
+        result, cache_hit = cached_asr(key, lambda: transcribe_audio(
+            audio_path, args.model_dir, task=args.task, vad=args.vad, workers=args.workers, backend=args.backend,
+            assistant_dir=args.assistant))
+        print(f"ASR cache {'hit, skipped Whisper' if cache_hit else 'miss'}")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    create_srt(result, base + "_orig.srt")
+    print(f"ASR result saved: {base}.json, subtitles: {base}_orig.srt")
+
+
+def load_result(path):
+    """An ASR result: the JSON written by `transcribe`, or the cues of an existing SRT/VTT file."""
+    if path.lower().endswith(".json"):
+        import json
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    from burn import read_srt_cues
+    return {"chunks": [{"timestamp": (start, end), "text": text} for start, end, text in read_srt_cues(path)]}
+
+
+def cmd_translate(args):
+    from transcription_multy import create_srts
+    result = load_result(args.input)
+    base = _stem(args.input)
+    if base.endswith("_orig"):
+        base = base[:-len("_orig")]
+    srt_paths = create_srts(result, {lang: f"{base}_{lang}.srt" for lang in args.languages}, api_key=args.api_key,
+                            source=args.source)
+    for srt_path in srt_paths.values():
+        print(f"SRT file saved: {srt_path}")
+
+
+def cmd_burn(args):
+    from burn import burn_subtitles_multi, burn_subtitles_segments, mux_soft_subtitles
+    from media import has_video
+    if not args.soft and not has_video(args.video):
+        print(f"{args.video} has no video stream to burn into; use --soft or the SRT itself")
+        return 1
+    if args.soft:
+        # movie_en.srt -> track title "en"
+        lang = _stem(os.path.basename(args.srt)).rsplit("_", 1)[-1]
+        mux_soft_subtitles(args.video, [(lang, args.srt)], args.output)
+    elif args.segments:
+        burn_subtitles_segments(args.video, args.srt, args.output, profile=args.profile)
+    else:
+        burn_subtitles_multi(args.video, [(args.srt, args.output)], profile=args.profile)
+    print(f"Done! Output video: {args.output}")
+
+
+def cmd_all(args):
+    from transcription_multy import main
+    main(
+        args.video,
+        args.output,
+        args.model_dir,
+        task=args.task,
+        output_languages=args.languages,
+        api_key=args.api_key,
+        stream=args.stream,
+        soft=args.soft,
+        vad=args.vad,
+        workers=args.workers,
+        threads_per_worker=args.threads,
+        metrics_path=args.metrics,
+        profile=args.profile_stages,
+        work_dir=args.workdir,
+        burn_profile=args.burn_profile,
+        burn_segments=args.burn_segments,
+        backend=args.backend,
+        assistant_dir=args.assistant
+    )
+
+
+def import_times(code):
+    """(total ms, imported module names) for running `code` in a fresh interpreter, from -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          cwd=APP_DIR)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    total_us, modules = 0, []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        # Nested imports are indented one more level; only top-level ones add up to the total
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def cmd_startup(args):
+    failures = []
+    cli_ms, _ = import_times("import subs")
+    print(f"{'subs.py start-up':>22}: {cli_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if cli_ms > args.budget_ms:
+        failures.append(f"start-up takes {cli_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for command, modules in COMMAND_IMPORTS.items():
+        ms, imported = import_times("import " + ", ".join(modules))
+        heavy = sorted({name.split(".")[0] for name in imported} & set(HEAVY_MODULES))
+        print(f"{command:>22}: {ms:8.1f} ms{'  loads ' + ', '.join(heavy) if heavy else ''}")
+        if heavy:
+            # Even transcribe/all must only load them once a model is actually needed
+            failures.append(f"{command} imports {', '.join(heavy)} at start-up")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+def _add_asr_options(parser):
+    parser.add_argument("--task", default="transcribe", choices=["transcribe", "translate"],
+                        help="'transcribe' (audio in Hebrew) or 'translate' (audio not in Hebrew)")
+    parser.add_argument("--vad", action="store_true", help="only send detected speech to Whisper")
+    parser.add_argument("--workers", type=int, default=0, help="transcribe overlapping windows in N processes")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="ASR inference mode")
+    parser.add_argument("--assistant", help="small Whisper checkpoint for assisted decoding")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="subs.py", description="Extract, transcribe, translate and burn subtitles.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="write the 16 kHz mono WAV the models expect")
+    extract.add_argument("video")
+    extract.add_argument("-o", "--output", help="default: VIDEO with a .wav extension")
+    extract.set_defaults(func=cmd_extract)
+
+    transcribe = commands.add_parser("transcribe", help="ASR result as JSON plus the original-language SRT")
+    transcribe.add_argument("input", help="video, or an extracted WAV")
+    transcribe.add_argument("model_dir")
+    transcribe.add_argument("-o", "--output", help="output base name (default: next to INPUT)")
+    _add_asr_options(transcribe)
+    transcribe.set_defaults(func=cmd_transcribe)
+
+    translate = commands.add_parser("translate", help="translated SRTs from an ASR JSON or an existing SRT")
+    translate.add_argument("input", help="JSON written by `transcribe`, or an SRT/VTT file")
+    translate.add_argument("languages", nargs="+")
+    translate.add_argument("--source", default="he", help="language of INPUT (default he)")
+    translate.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY", "key"))
+    translate.set_defaults(func=cmd_translate)
+
+    burn = commands.add_parser("burn", help="burn an SRT into a video, or add it as a subtitle track")
+    burn.add_argument("video")
+    burn.add_argument("srt")
+    burn.add_argument("output")
+    burn.add_argument("--profile", default=DEFAULT_PROFILE, choices=list(BURN_PROFILES))
+    burn.add_argument("--segments", action="store_true", help="re-encode only the parts with subtitles")
+    burn.add_argument("--soft", action="store_true", help="mux as a subtitle track instead of burning")
+    burn.set_defaults(func=cmd_burn)
+
+    run_all = commands.add_parser("all", help="the whole pipeline, like transcription_multy.py")
+    run_all.add_argument("video")
+    run_all.add_argument("output")
+    run_all.add_argument("model_dir")
+    run_all.add_argument("languages", nargs="*", help="target languages for translated subtitles")
+    _add_asr_options(run_all)
+    run_all.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY", "key"))
+    run_all.add_argument("--stream", action="store_true", help="pipe audio into the model, no temporary WAV")
+    run_all.add_argument("--soft", action="store_true", help="add all SRTs as subtitle tracks instead of burning")
+    run_all.add_argument("--threads", type=int, default=2, help="torch threads per worker process")
+    run_all.add_argument("--metrics", help="per-stage metrics file (JSON lines, or Prometheus if .prom)")
+    run_all.add_argument("--profile-stages", action="store_true", help="write cProfile stats next to the output")
+    run_all.add_argument("--workdir", help="keep finished stages in this directory and resume from it")
+    run_all.add_argument("--burn-profile", default=DEFAULT_PROFILE, choices=list(BURN_PROFILES))
+    run_all.add_argument("--burn-segments", action="store_true", help="re-encode only the parts with subtitles")
+    run_all.set_defaults(func=cmd_all)
+
+    startup = commands.add_parser("startup", help="import-time report for the CLI and every subcommand")
+    startup.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    startup.set_defaults(func=cmd_startup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+
+FORMATS = ("srt", "vtt", "ass")
+# Duration given to a final cue whose end the ASR left open.
+DEFAULT_CUE_MS = 3000
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1280
+PlayResY: 720
+WrapStyle: 0
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,48,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,2,20,20,30,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def to_ms(seconds):
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(ms, fmt="srt"):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    if fmt == "ass":
+        return f"{hours}:{minutes:02d}:{seconds:02d}.{ms // 10:02d}"
+    separator = "," if fmt == "srt" else "."
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+class SubtitleWriter:
+    """
+    Writes cues to disk as they arrive, in SRT, WebVTT or ASS (picked from the file extension by default).
+    A cue with an open (None) end is held back until the next cue starts, or gets DEFAULT_CUE_MS at close().
+    Empty cues are skipped and the rest numbered consecutively, like srt.compose did.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower() or "srt"
+        if self.fmt not in FORMATS:
+            raise ValueError(f"unsupported subtitle format: {self.fmt}")
+        self.count = 0
+        self._pending = None
+        self._file = open(path, "w", encoding="utf-8")
+        if self.fmt == "vtt":
+            self._file.write("WEBVTT\n\n")
+        elif self.fmt == "ass":
+            self._file.write(ASS_HEADER)
+
+    def write(self, start, end, text):
+        start_ms = to_ms(start or 0.0)
+        if self._pending is not None:
+            pending_start, pending_text = self._pending
+            self._pending = None
+            self._emit(pending_start, max(start_ms, pending_start), pending_text)
+        if end is None:
+            self._pending = (start_ms, text)
+        else:
+            self._emit(start_ms, max(to_ms(end), start_ms), text)
+
+    def _emit(self, start_ms, end_ms, text):
+        text = text.strip()
+        if not text:
+            return
+        self.count += 1
+        start, end = format_timestamp(start_ms, self.fmt), format_timestamp(end_ms, self.fmt)
+        if self.fmt == "ass":
+            text = text.replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+            self._file.write(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}\n")
+            return
+        # A blank line would end the cue early
+        text = "\n".join(line for line in text.splitlines() if line.strip())
+        if self.fmt == "vtt":
+            text = text.replace("-->", "->")
+            self._file.write(f"{start} --> {end}\n{text}\n\n")
+        else:
+            self._file.write(f"{self.count}\n{start} --> {end}\n{text}\n\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._pending is not None:
+            start_ms, text = self._pending
+            self._pending = None
+            self._emit(start_ms, start_ms + DEFAULT_CUE_MS, text)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,49 @@
+from parallel_asr import SAMPLE_RATE, merge_windows
+
+
+def chunk(start, end, text):
+    return {'timestamp': (start, end), 'text': text}
+
+
+def window(start_s, end_s):
+    return start_s * SAMPLE_RATE, end_s * SAMPLE_RATE
+
+
+def texts(chunks):
+    return [c['text'] for c in chunks]
+
+
+def test_segment_cut_at_window_end_comes_from_next_window():
+    windows = [window(0, 30), window(25, 55)]
+    first = [chunk(0, 8, 'A'), chunk(8, 26, 'B'), chunk(26, 30, 'C-cut')]
+    second = [chunk(25, 26, 'B-tail'), chunk(26, 33, 'C'), chunk(33, 40, 'D')]
+    merged = merge_windows([first, second], windows)
+    assert texts(merged) == ['A', 'B', 'C', 'D']
+    assert merged[2]['timestamp'] == (26, 33)
+
+
+def test_cut_segment_starting_before_next_window_is_kept():
+    windows = [window(0, 120), window(105, 225)]
+    first = [chunk(0, 100, 'A'), chunk(100, 119.5, 'B')]
+    second = [chunk(105, 119.5, 'B tail only'), chunk(119.5, 130, 'C')]
+    merged = merge_windows([first, second], windows)
+    assert texts(merged) == ['A', 'B', 'C']
+    assert merged[1]['timestamp'] == (100, 119.5)
+
+
+def test_overlap_repeats_are_dropped():
+    windows = [window(0, 30), window(25, 55)]
+    first = [chunk(0, 10, 'A'), chunk(10, 26, 'B')]
+    second = [chunk(25.2, 26, 'B-tail'), chunk(26, 35, 'C')]
+    assert texts(merge_windows([first, second], windows)) == ['A', 'B', 'C']
+
+
+def test_last_window_keeps_its_final_segment():
+    windows = [window(0, 30), window(25, 40)]
+    first = [chunk(0, 20, 'A')]
+    second = [chunk(26, 40, 'B')]
+    assert texts(merge_windows([first, second], windows)) == ['A', 'B']
+
+
+def test_single_window():
+    assert texts(merge_windows([[chunk(0, 5, 'A'), chunk(5, 10, 'B')]], [window(0, 10)])) == ['A', 'B']
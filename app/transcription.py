@@ -1,10 +1,13 @@
 import os
-import subprocess
+import shutil
 import tempfile
 
-import requests
-import srt
-from transformers import pipeline, WhisperForConditionalGeneration, AutoTokenizer, AutoFeatureExtractor, GenerationConfig
+import media
+from asr_cache import asr_cache_key, audio_fingerprint, cached_asr
+from burn import burn_subtitles_multi
+from model_registry import DEFAULT_BACKEND, get_asr_pipeline
+from subtitle_writer import SubtitleWriter
+from translation import translate_texts
 
 
 # def google_translate_text(text, target='he', api_key=None):
@@ -14,45 +17,11 @@ from transformers import pipeline, WhisperForConditionalGeneration, AutoTokenize
 #     return result['translatedText']
 
 
-def google_translate_text(text, target='he', api_key=None):
-    url = "https://translation.googleapis.com/language/translate/v2"
-    params = {
-        "q": text,
-        "target": target,
-        "format": "text",
-        "key": api_key
-    }
-    response = requests.post(url, data=params, verify=False)
-    response.raise_for_status()
-    return response.json()['data']['translations'][0]['translatedText']
-
-def extract_audio(video_path, audio_path):
-    cmd = [
-        'ffmpeg', '-y', '-i', video_path,
-        '-ar', '16000', '-ac', '1', '-c:a', 'pcm_s16le',
-        audio_path
-    ]
-    subprocess.run(cmd, check=True)
+def extract_audio(video_path, audio_path, language=None):
+    return media.extract_audio(video_path, audio_path, language=language)
 
 def transcribe_audio(audio_path, model_dir, task="transcribe"):
-    model = WhisperForConditionalGeneration.from_pretrained(model_dir, local_files_only=True)
-    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
-    feature_extractor = AutoFeatureExtractor.from_pretrained(model_dir, local_files_only=True)
-    if not hasattr(model, "generation_config") or model.generation_config is None:
-        model.generation_config = GenerationConfig.from_pretrained(model_dir, local_files_only=True)
-    if getattr(model.generation_config, "no_timestamps_token_id", None) is None:
-        model.generation_config.no_timestamps_token_id = tokenizer.convert_tokens_to_ids("<|notimestamps|>")
-    if getattr(model.generation_config, "task", None) is None:
-        model.generation_config.task = task
-    if getattr(model.generation_config, "language", None) is None:
-        model.generation_config.language = "he"
-    asr = pipeline(
-        "automatic-speech-recognition",
-        model=model,
-        tokenizer=tokenizer,
-        feature_extractor=feature_extractor,
-        generate_kwargs={"task": task}
-    )
+    asr = get_asr_pipeline(model_dir, task=task, language="he")
     return asr(audio_path, return_timestamps=True)
 
 
@@ -63,38 +32,21 @@ def transcribe_audio(audio_path, model_dir, task="transcribe"):
 
 def create_srt(result, srt_path, to_language="he", do_translate=False, api_key=None):
     print("Creating srt...")
-    subs = []
-    for i, chunk in enumerate(result['chunks']):
-        start = chunk['timestamp'][0]
-        end = chunk['timestamp'][1]
-        text = chunk['text'].strip()
-        if do_translate and text:
-            try:
-                translated = google_translate_text(text, target=to_language, api_key=api_key)
+    texts = [chunk['text'].strip() for chunk in result['chunks']]
+    if do_translate:
+        # Only called for Whisper's translate task, so the text is English
+        translations = translate_texts(texts, target=to_language, api_key=api_key, source="en")
+    else:
+        translations = texts
+    # Cues go straight to disk; the format (srt/vtt/ass) follows the file extension
+    with SubtitleWriter(srt_path) as writer:
+        for chunk, text, translated in zip(result['chunks'], texts, translations):
+            if do_translate and text:
                 print(f"EN: {text}\nHE: {translated}\n---")
-            except Exception as e:
-                print(f"Translation error: {e}")
-                translated = text
-        else:
-            translated = text
-        subs.append(srt.Subtitle(
-            index=i + 1,
-            start=srt.timedelta(seconds=start),
-            end=srt.timedelta(seconds=end),
-            content=translated
-        ))
-    with open(srt_path, "w", encoding="utf-8") as f:
-        f.write(srt.compose(subs))
+            writer.write(chunk['timestamp'][0], chunk['timestamp'][1], translated)
 
 def burn_subtitles(video_path, srt_path, output_path):
-    cmd = [
-        'ffmpeg', '-y',
-        '-i', video_path,
-        '-vf', f"subtitles={srt_path}:force_style='FontName=Arial'",
-        '-c:a', 'copy',
-        output_path
-    ]
-    subprocess.run(cmd, check=True)
+    return burn_subtitles_multi(video_path, [(srt_path, output_path)])
 
 def main(video_path, output_path, model_dir, task="transcribe"):
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -102,9 +54,11 @@ def main(video_path, output_path, model_dir, task="transcribe"):
         audio_path = os.path.join(tmpdir, "audio.wav")
         srt_path = os.path.join(tmpdir, "subtitles.srt")
         print("Extracting audio...")
-        extract_audio(video_path, audio_path)
+        extract_audio(video_path, audio_path, language="he" if task == "transcribe" else None)
         print(f"Transcribing ({'transcribe' if task=='transcribe' else 'translate to English'})...")
-        result = transcribe_audio(audio_path, model_dir, task=task)
+        key = asr_cache_key(audio_fingerprint(audio_path), model_dir, task=task, backend=DEFAULT_BACKEND)
+        result, cache_hit = cached_asr(key, lambda: transcribe_audio(audio_path, model_dir, task=task))
+        print(f"ASR cache {'hit, skipped Whisper' if cache_hit else 'miss'}")
         print("Creating SRT subtitles...")
         # Only translate to Hebrew if we used Whisper's translate (to English)
         do_translate = (task == "translate")
@@ -112,6 +66,12 @@ def main(video_path, output_path, model_dir, task="transcribe"):
         create_srt(result, srt_path, to_language="ru", do_translate=do_translate,
                    api_key=GOOGLE_API_KEY if do_translate else None)
         # create_srt(result, srt_path, to_language="he", do_translate=do_translate)
+        if not media.has_video(video_path):
+            # Audio-only input: nothing to burn into, keep the subtitles next to the output instead
+            srt_out = os.path.splitext(output_path)[0] + ".srt"
+            shutil.copyfile(srt_path, srt_out)
+            print(f"No video stream, subtitles saved: {srt_out}")
+            return
         print("Burning subtitles into video...")
         burn_subtitles(video_path, srt_path, output_path)
         print(f"Done! Output video: {output_path}")
@@ -1,141 +1,271 @@
+import json
 import os
-import subprocess
+import shutil
 import tempfile
-import requests
-import srt
-from transformers import pipeline, WhisperForConditionalGeneration, AutoTokenizer, AutoFeatureExtractor, GenerationConfig
-
-def google_translate_text(text, target='he', api_key=None):
-    url = "https://translation.googleapis.com/language/translate/v2"
-    params = {
-        "q": text,
-        "target": target,
-        "format": "text",
-        "key": api_key
-    }
-    response = requests.post(url, data=params, verify=False)  # Remove verify=False after fixing SSL
-    response.raise_for_status()
-    return response.json()['data']['translations'][0]['translatedText']
-
-def extract_audio(video_path, audio_path):
-    cmd = [
-        'ffmpeg', '-y', '-i', video_path,
-        '-ar', '16000', '-ac', '1', '-c:a', 'pcm_s16le',
-        audio_path
-    ]
-    subprocess.run(cmd, check=True)
-
-def transcribe_audio(audio_path, model_dir, task="transcribe"):
-    model = WhisperForConditionalGeneration.from_pretrained(model_dir, local_files_only=True)
-    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
-    feature_extractor = AutoFeatureExtractor.from_pretrained(model_dir, local_files_only=True)
-    if not hasattr(model, "generation_config") or model.generation_config is None:
-        model.generation_config = GenerationConfig.from_pretrained(model_dir, local_files_only=True)
-    if getattr(model.generation_config, "no_timestamps_token_id", None) is None:
-        model.generation_config.no_timestamps_token_id = tokenizer.convert_tokens_to_ids("<|notimestamps|>")
-    if getattr(model.generation_config, "task", None) is None:
-        model.generation_config.task = task
-    if getattr(model.generation_config, "language", None) is None:
-        model.generation_config.language = "he"
-    asr = pipeline(
-        "automatic-speech-recognition",
-        model=model,
-        tokenizer=tokenizer,
-        feature_extractor=feature_extractor,
-        generate_kwargs={"task": task}
-    )
+from contextlib import nullcontext
+
+import media
+from asr_cache import asr_cache_key, audio_fingerprint, cached_asr, stream_fingerprint
+from audio_stream import transcribe_stream
+from burn import DEFAULT_PROFILE, burn_subtitles_multi, burn_subtitles_segments, mux_soft_subtitles
+from metrics import Metrics, wav_duration
+from model_registry import BACKENDS, DEFAULT_BACKEND, get_asr_pipeline
+from parallel_asr import WINDOW_S, transcribe_parallel
+from segments import ORIGINAL, SegmentTable
+from vad import transcribe_speech_only
+from workdir import WorkDir
+
+def extract_audio(video_path, audio_path, language=None):
+    # One cached ffprobe picks the audio track (tagged with language if there is one) and whether it needs resampling
+    return media.extract_audio(video_path, audio_path, language=language)
+
+def transcribe_audio(audio_path, model_dir, task="transcribe", vad=False, workers=0, threads_per_worker=2,
+                     checkpoint_dir=None, backend=DEFAULT_BACKEND, assistant_dir=None, asr=None):
+    # asr: an already loaded pipeline (or a stand-in) for the in-process paths instead of the registry's
+    if workers or (checkpoint_dir and not vad):
+        # Overlapping windows, in a process pool when workers are given, each worker with its own model.
+        # With checkpoint_dir finished windows are kept and skipped on the next run.
+        return transcribe_parallel(audio_path, model_dir, task=task, language="he", workers=workers,
+                                   threads_per_worker=threads_per_worker, checkpoint_dir=checkpoint_dir,
+                                   backend=backend, assistant_dir=assistant_dir)
+    asr = asr or get_asr_pipeline(model_dir, task=task, language="he", backend=backend, assistant_dir=assistant_dir)
+    if vad:
+        # Only the detected speech regions go through Whisper
+        return transcribe_speech_only(asr, audio_path)
+    # The pipeline decodes the whole file into memory; windowed runs read it from the map a window at a time
     return asr(audio_path, return_timestamps=True)
 
-def create_srt(result, srt_path, to_language=None, do_translate=False, api_key=None):
+def transcription_key(audio_path, model_dir, task="transcribe", vad=False, windowed=False, backend=DEFAULT_BACKEND,
+                      assistant_dir=None):
+    """ASR cache key for transcribe_audio with these settings (windowed: workers or checkpointed windows)."""
+    window_s = WINDOW_S if windowed and not vad else None
+    return asr_cache_key(audio_fingerprint(audio_path), model_dir, task=task, vad=vad, window_s=window_s,
+                         backend=backend, assistant=os.path.abspath(assistant_dir) if assistant_dir else None)
+
+def transcribe_video_stream(video_path, model_dir, task="transcribe", backend=DEFAULT_BACKEND, assistant_dir=None,
+                            audio_stream=None):
+    asr = get_asr_pipeline(model_dir, task=task, language="he", backend=backend, assistant_dir=assistant_dir)
+    return transcribe_stream(video_path, asr, audio_stream=audio_stream)
+
+def source_language(task):
+    # Whisper's translate task already turned the speech into English
+    return "he" if task == "transcribe" else "en"
+
+def create_srt(result, srt_path, to_language=None, do_translate=False, api_key=None, source=None):
     print(f"Creating SRT: {srt_path} ({'translating' if do_translate else 'original'})")
-    subs = []
-    for i, chunk in enumerate(result['chunks']):
-        start = chunk['timestamp'][0]
-        end = chunk['timestamp'][1]
-        text = chunk['text'].strip()
-        if do_translate and text and to_language:
-            try:
-                translated = google_translate_text(text, target=to_language, api_key=api_key)
-                print(f"ORIG: {text}\n{to_language.upper()}: {translated}\n---")
-            except Exception as e:
-                print(f"Translation error: {e}")
-                translated = text
+    column = to_language if do_translate and to_language else ORIGINAL
+    create_srts(result, {column: srt_path}, api_key=api_key, source=source)
+
+def create_srts(result, srt_paths, api_key=None, source=None, table=None):
+    """Subtitle files {'orig' or language: path} of one result: each language translated once, one write pass."""
+    table = table or SegmentTable.from_result(result, source=source)
+    for lang in srt_paths:
+        if lang != ORIGINAL:
+            table.translate(lang, api_key=api_key)
+    return table.write(srt_paths)
+
+def burn_subtitles(video_path, srt_path, output_path, profile=DEFAULT_PROFILE, segments=False):
+    if segments:
+        return burn_subtitles_segments(video_path, srt_path, output_path, profile=profile)
+    return burn_subtitles_multi(video_path, [(srt_path, output_path)], profile=profile)
+
+def languages_order(srt_paths):
+    # Translated languages first, the original last, as they were burned one by one before
+    return [lang for lang in srt_paths if lang != 'orig'] + ['orig']
+
+def main(video_path, output_path_base, model_dir, task="transcribe", output_languages=None, api_key=None,
+         stream=False, soft=False, vad=False, workers=0, threads_per_worker=2, metrics_path=None, profile=False,
+         work_dir=None, burn_profile=DEFAULT_PROFILE, burn_segments=False, backend=DEFAULT_BACKEND,
+         assistant_dir=None):
+    base, ext = os.path.splitext(output_path_base)
+    metrics = Metrics(path=metrics_path, profile_dir=os.path.dirname(base) or "." if profile else None,
+                      job=os.path.basename(base))
+    if vad and (stream or workers):
+        print("VAD needs the whole extracted audio in one piece, ignoring it with --stream / --workers")
+        vad = False
+    # Resumable runs transcribe in checkpointed windows (in this process unless workers are given)
+    windowed = bool(workers) or (bool(work_dir) and not vad and not stream)
+    assistant = os.path.abspath(assistant_dir) if assistant_dir else None
+    work = WorkDir(work_dir, video_path, model_dir=os.path.abspath(model_dir), task=task, vad=vad,
+                   windowed=windowed, stream=stream, backend=backend,
+                   assistant=assistant) if work_dir else None
+
+    def stage_done(name):
+        return work is not None and work.done(name)
+
+    def run_asr(transcribe, audio_seconds=None):
+        if not workers:
+            with metrics.stage("model_load", model=model_dir, backend=backend, assistant=assistant_dir):
+                get_asr_pipeline(model_dir, task=task, language="he", backend=backend, assistant_dir=assistant_dir)
+        with metrics.stage("asr", audio_seconds=audio_seconds, model=model_dir, task=task, backend=backend,
+                           assistant=assistant_dir) as record, \
+                metrics.profile("asr"):
+            result = transcribe()
+            if audio_seconds is None and result['chunks']:
+                record["audio_seconds"] = result['chunks'][-1]['timestamp'][1]
+        return result
+
+    with (nullcontext(work.path) if work else tempfile.TemporaryDirectory()) as tmpdir:
+        print(f"{'Work' if work else 'Temporary'} directory: {tmpdir}")
+        asr_path = os.path.join(tmpdir, "asr.json")
+        if stage_done("asr"):
+            print("ASR already done, loading checkpoint")
+            with open(asr_path, encoding="utf-8") as f:
+                result = json.load(f)
+        elif stream:
+            # ffmpeg PCM goes straight into the pipeline in blocks, no audio.wav on disk
+            print(f"Streaming audio ({'transcribe' if task == 'transcribe' else 'translate to English'})...")
+            # The same track extract_audio would pick, for the decode and the cache key alike
+            track = media.select_audio_track(media.probe(video_path), "he" if task == "transcribe" else None)
+            if track is None:
+                raise ValueError(f"{video_path}: no audio stream")
+            key = asr_cache_key(stream_fingerprint(video_path, track["index"]), model_dir, task=task,
+                                backend=backend, assistant=assistant)
+            result, cache_hit = cached_asr(key, lambda: run_asr(lambda: transcribe_video_stream(
+                video_path, model_dir, task=task, backend=backend, assistant_dir=assistant_dir,
+                audio_stream=track["index"])))
+            print(f"ASR cache {'hit, skipped Whisper' if cache_hit else 'miss'}")
+        else:
+            audio_path = os.path.join(tmpdir, "audio.wav")
+            if stage_done("extract_audio"):
+                print("Audio already extracted")
+                audio_seconds = wav_duration(audio_path)
+            else:
+                print("Extracting audio...")
+                with metrics.stage("extract_audio") as record:
+                    extract_audio(video_path, audio_path, language="he" if task == "transcribe" else None)
+                    record["audio_seconds"] = audio_seconds = wav_duration(audio_path)
+                if work:
+                    work.mark("extract_audio", files=[audio_path])
+            print(f"Transcribing ({'transcribe' if task == 'transcribe' else 'translate to English'})...")
+            checkpoint_dir = os.path.join(tmpdir, "asr_windows") if work and windowed else None
+            key = transcription_key(audio_path, model_dir, task=task, vad=vad, windowed=windowed, backend=backend,
+                                    assistant_dir=assistant_dir)
+            result, cache_hit = cached_asr(key, lambda: run_asr(lambda: transcribe_audio(
+                audio_path, model_dir, task=task, vad=vad, workers=workers, threads_per_worker=threads_per_worker,
+                checkpoint_dir=checkpoint_dir, backend=backend, assistant_dir=assistant_dir),
+                audio_seconds=audio_seconds))
+            print(f"ASR cache {'hit, skipped Whisper' if cache_hit else 'miss'}")
+        if work and not stage_done("asr"):
+            with open(asr_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            work.mark("asr", files=[asr_path], chunks=len(result['chunks']))
+
+        # Whisper output goes into the segment table once; every language is a translated column of it and
+        # all SRTs still missing are written together
+        table = SegmentTable.from_result(result, source=source_language(task))
+        srt_paths = {ORIGINAL: os.path.join(tmpdir, "subtitles_orig.srt")}
+        pending = {} if stage_done("srt_orig") else {ORIGINAL: srt_paths[ORIGINAL]}
+        for lang in output_languages or []:
+            srt_paths[lang] = os.path.join(tmpdir, f"subtitles_{lang}.srt")
+            if stage_done(f"srt_{lang}"):
+                print(f"SRT subtitles in {lang} already done")
+                continue
+            print(f"Translating subtitles to {lang}...")
+            with metrics.stage("translation", language=lang), metrics.profile(f"translation_{lang}"):
+                table.translate(lang, api_key=api_key)
+            pending[lang] = srt_paths[lang]
+        if pending:
+            print(f"Writing SRT subtitles: {', '.join(pending)}")
+            table.write(pending)
+            if work:
+                for lang, path in pending.items():
+                    if table.complete(lang):
+                        work.mark(f"srt_{lang}", files=[path])
+                    else:
+                        print(f"{table.untranslated[lang]} segment(s) in {lang} left untranslated, "
+                              f"the next run translates them again")
+
+        burn_stage = "soft_mux_" + "_".join(languages_order(srt_paths)) if soft else \
+            f"burn_{burn_profile}_" + "_".join(languages_order(srt_paths))
+        if stage_done(burn_stage):
+            print("Output videos already done")
+        elif not soft and not media.has_video(video_path):
+            print("No video stream (audio-only input), nothing to burn: writing the subtitles only")
         else:
-            translated = text
-        subs.append(srt.Subtitle(
-            index=i + 1,
-            start=srt.timedelta(seconds=start),
-            end=srt.timedelta(seconds=end),
-            content=translated
-        ))
-    with open(srt_path, "w", encoding="utf-8") as f:
-        f.write(srt.compose(subs))
-
-def burn_subtitles(video_path, srt_path, output_path):
-    cmd = [
-        'ffmpeg', '-y',
-        '-i', video_path,
-        '-vf', f"subtitles={srt_path}:force_style='FontName=Arial'",
-        '-c:a', 'copy',
-        output_path
-    ]
-    subprocess.run(cmd, check=True)
-
-def main(video_path, output_path_base, model_dir, task="transcribe", output_languages=None, api_key=None):
-    with tempfile.TemporaryDirectory() as tmpdir:
-        print(f"Temporary directory: {tmpdir}")
-        audio_path = os.path.join(tmpdir, "audio.wav")
-        print("Extracting audio...")
-        extract_audio(video_path, audio_path)
-        print(f"Transcribing ({'transcribe' if task == 'transcribe' else 'translate to English'})...")
-        result = transcribe_audio(audio_path, model_dir, task=task)
-
-        srt_paths = {}
-        # Save original language SRT (if wanted)
-        srt_orig = os.path.join(tmpdir, "subtitles_orig.srt")
-        create_srt(result, srt_orig, to_language=None, do_translate=False)
-        srt_paths['orig'] = srt_orig
-
-        # Translate and save SRT for each requested language
-        if output_languages:
-            for lang in output_languages:
-                srt_lang = os.path.join(tmpdir, f"subtitles_{lang}.srt")
-                print(f"Creating SRT subtitles in {lang}...")
-                create_srt(result, srt_lang, to_language=lang, do_translate=True, api_key=api_key)
-                srt_paths[lang] = srt_lang
-
-            # Burn each language SRT into a separate video
-            for lang in output_languages:
-                out_video = os.path.splitext(output_path_base)[0] + f"_{lang}.mp4"
-                print(f"Burning subtitles ({lang}) into video: {out_video}")
-                burn_subtitles(video_path, srt_paths[lang], out_video)
-                print(f"Done! Output video with {lang} subtitles: {out_video}")
-
-        out_video_orig = os.path.splitext(output_path_base)[0] + "_orig.mp4"
-        burn_subtitles(video_path, srt_paths['orig'], out_video_orig)
+            with metrics.stage("burn", mode="soft" if soft else "burn", outputs=len(srt_paths),
+                               profile=None if soft else burn_profile) as record:
+                if soft:
+                    out_video = base + "_subs" + (ext or ".mp4")
+                    print(f"Muxing {len(srt_paths)} subtitle track(s) into: {out_video}")
+                    mux_soft_subtitles(video_path, [(lang, srt_paths[lang]) for lang in languages_order(srt_paths)],
+                                       out_video)
+                    print(f"Done! Output video with subtitle tracks: {out_video}")
+                    out_videos = [out_video]
+                else:
+                    outputs = [(srt_paths[lang], base + f"_{lang}.mp4") for lang in languages_order(srt_paths)]
+                    print(f"Burning subtitles ({', '.join(languages_order(srt_paths))}) into {len(outputs)} videos...")
+                    if burn_segments:
+                        # Only the subtitled stretches are re-encoded, so each language is its own run
+                        stats = [burn_subtitles_segments(video_path, srt_path, out_video, profile=burn_profile)
+                                 for srt_path, out_video in outputs]
+                        record["encode_fps"] = round(sum(s["fps"] for s in stats) / len(stats), 1)
+                    else:
+                        # One ffmpeg run decodes the input once and encodes every language variant
+                        record["encode_fps"] = burn_subtitles_multi(video_path, outputs, profile=burn_profile)["fps"]
+                    for srt_path, out_video in outputs:
+                        print(f"Done! Output video: {out_video}")
+                    out_videos = [out_video for _, out_video in outputs]
+            if work:
+                work.mark(burn_stage, files=out_videos)
 
         # Save all SRTs
         for lang, path in srt_paths.items():
-            out_srt = os.path.splitext(output_path_base)[0] + f"_{lang}.srt"
-            os.rename(path, out_srt)
+            out_srt = base + f"_{lang}.srt"
+            if work:
+                # keep the checkpoint, a later run may still need it
+                shutil.copyfile(path, out_srt)
+            else:
+                os.rename(path, out_srt)
             print(f"SRT file saved: {out_srt}")
+    metrics.finish()
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) < 4:
-        print("Usage: python script.py input_video output_video model_dir [task] [lang1 lang2 ...]")
+    options = {}
+    for arg in sys.argv[1:]:
+        if arg.startswith("--"):
+            name, _, value = arg[2:].partition("=")
+            options[name] = value or True
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) < 3:
+        print("Usage: python script.py input_video output_video model_dir [task] [lang1 lang2 ...] [--stream] [--soft] [--vad] [--workers=N] [--threads=N] [--metrics=FILE] [--profile] [--workdir=DIR] [--burn-profile=NAME] [--burn-segments] [--backend=NAME] [--assistant=DIR]")
         print("task: 'transcribe' (audio in Hebrew), 'translate' (audio not in Hebrew)")
+        print("--stream: pipe audio from ffmpeg into the model instead of writing a temporary WAV")
+        print("--soft: add all SRTs as subtitle tracks (no re-encode) instead of burning one video per language")
+        print("--vad: only send detected speech to Whisper (faster on mostly silent videos)")
+        print("--workers=N: transcribe overlapping windows in N processes, --threads=N torch threads per process")
+        print("--metrics=FILE: per-stage timings as JSON lines, or Prometheus text if FILE ends in .prom")
+        print("--profile: write cProfile stats for the ASR and translation stages next to the output")
+        print("--workdir=DIR: keep every finished stage in DIR and resume from it when re-run")
+        print("--burn-profile=NAME: fast-preview, balanced (default) or archival encoder settings")
+        print("--burn-segments: re-encode only the parts with subtitles and stream-copy the rest")
+        print(f"--backend=NAME: ASR inference mode, one of {', '.join(BACKENDS)} (default {DEFAULT_BACKEND})")
+        print("--assistant=DIR: small Whisper checkpoint that drafts tokens for the main model (assisted decoding)")
+        print("Translation provider: SUBS_TRANSLATOR=google-v2 (default), libretranslate, local-mt or deep-translator-google")
         print("Example: python script.py input.mp4 output.mp4 /path/to/whisper-small translate he en ru")
         sys.exit(1)
-    task = sys.argv[4] if len(sys.argv) > 4 else "transcribe"
-    output_languages = sys.argv[5:] if len(sys.argv) > 5 else []
+    task = args[3] if len(args) > 3 else "transcribe"
+    output_languages = args[4:] if len(args) > 4 else []
     # Use your real Google API key here!
     GOOGLE_API_KEY = "key"
     main(
-        sys.argv[1],
-        sys.argv[2],
-        sys.argv[3],
+        args[0],
+        args[1],
+        args[2],
         task=task,
         output_languages=output_languages,
-        api_key=GOOGLE_API_KEY
+        api_key=GOOGLE_API_KEY,
+        stream="stream" in options,
+        soft="soft" in options,
+        vad="vad" in options,
+        workers=int(options.get("workers", 0)),
+        threads_per_worker=int(options.get("threads", 2)),
+        metrics_path=options.get("metrics"),
+        profile="profile" in options,
+        work_dir=options.get("workdir"),
+        burn_profile=options.get("burn-profile", DEFAULT_PROFILE),
+        burn_segments="burn-segments" in options,
+        backend=options.get("backend", DEFAULT_BACKEND),
+        assistant_dir=options.get("assistant")
     )
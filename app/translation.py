@@ -0,0 +1,285 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from translation_cache import OFFLINE, get_cache
+
+GOOGLE_TRANSLATE_URL = "https://translation.googleapis.com/language/translate/v2"
+GOOGLE_V2_BACKEND = "google-v2"
+LIBRETRANSLATE_BACKEND = "libretranslate"
+LOCAL_MT_BACKEND = "local-mt"
+DEEP_TRANSLATOR_BACKEND = "deep-translator-google"
+# Provider used when the caller does not name one; the other settings only matter for their provider.
+TRANSLATOR = os.environ.get("SUBS_TRANSLATOR", GOOGLE_V2_BACKEND)
+LIBRETRANSLATE_URL = os.environ.get("SUBS_LIBRETRANSLATE_URL", "http://localhost:5000")
+LIBRETRANSLATE_KEY = os.environ.get("SUBS_LIBRETRANSLATE_KEY")
+# Local MarianMT/NLLB checkpoint; {source} and {target} are filled in, e.g. /models/opus-mt-{source}-{target}
+MT_MODEL = os.environ.get("SUBS_MT_MODEL", "")
+MT_DEVICE = os.environ.get("SUBS_MT_DEVICE", "cpu")
+MT_BATCH_SIZE = int(os.environ.get("SUBS_MT_BATCH_SIZE", "16"))
+# Per-pair Marian models mostly exist to and from English only, so other pairs go through it
+MT_PIVOT = os.environ.get("SUBS_MT_PIVOT", "en")
+# The v2 endpoint accepts up to 128 q values per request; stay under the recommended payload size.
+MAX_SEGMENTS_PER_REQUEST = 100
+MAX_CHARS_PER_REQUEST = 5000
+MAX_PARALLEL_REQUESTS = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_PARALLEL_REQUESTS, pool_maxsize=MAX_PARALLEL_REQUESTS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.verify = False  # Remove verify=False after fixing SSL
+            _session = session
+        return _session
+
+
+def _retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return min(30.0, 2 ** attempt) + random.uniform(0, 0.5)
+
+
+def _post(url, **kwargs):
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = session.post(url, **kwargs)
+        except requests.ConnectionError:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(_retry_delay(None, attempt))
+            continue
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            time.sleep(_retry_delay(response, attempt))
+            continue
+        response.raise_for_status()
+        return response.json()
+
+
+def google_translate_batch(texts, target='he', api_key=None):
+    params = [("q", text) for text in texts]
+    params += [("target", target), ("format", "text"), ("key", api_key)]
+    return [t['translatedText'] for t in _post(GOOGLE_TRANSLATE_URL, data=params)['data']['translations']]
+
+
+def google_translate_text(text, target='he', api_key=None):
+    return google_translate_batch([text], target=target, api_key=api_key)[0]
+
+
+def pack_batches(texts, max_segments=MAX_SEGMENTS_PER_REQUEST, max_chars=MAX_CHARS_PER_REQUEST):
+    """Group indices of non-empty texts into requests bounded by segment count and total characters."""
+    batches, batch, chars = [], [], 0
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        if batch and (len(batch) >= max_segments or chars + len(text) > max_chars):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(i)
+        chars += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class Translator:
+    """
+    A translation provider. translate_batch gets at most max_segments texts / max_chars characters and
+    returns their translations in order; translate_texts runs up to max_workers batches at once.
+    name identifies the provider (and model) in the translation cache. pivot names a language that
+    targets are better translated from than from the source directly (SegmentTable), None for none.
+    """
+    name = None
+    pivot = None
+    max_segments = MAX_SEGMENTS_PER_REQUEST
+    max_chars = MAX_CHARS_PER_REQUEST
+    max_workers = MAX_PARALLEL_REQUESTS
+
+    def translate_batch(self, texts, target, source=None):
+        raise NotImplementedError
+
+
+class GoogleV2Translator(Translator):
+    name = GOOGLE_V2_BACKEND
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+
+    def translate_batch(self, texts, target, source=None):
+        return google_translate_batch(texts, target=target, api_key=self.api_key)
+
+
+class LibreTranslator(Translator):
+    """LibreTranslate /translate, e.g. a local server started with `libretranslate --load-only he,en,ru`."""
+    name = LIBRETRANSLATE_BACKEND
+    max_segments = 50
+
+    def __init__(self, url=LIBRETRANSLATE_URL, api_key=LIBRETRANSLATE_KEY):
+        self.url = url.rstrip("/") + "/translate"
+        self.api_key = api_key
+
+    def translate_batch(self, texts, target, source=None):
+        payload = {"q": list(texts), "source": source or "auto", "target": target, "format": "text"}
+        if self.api_key:
+            payload["api_key"] = self.api_key
+        translated = _post(self.url, json=payload)["translatedText"]
+        return translated if isinstance(translated, list) else [translated]
+
+
+class DeepTranslatorGoogle(Translator):
+    """deep-translator's GoogleTranslator (web endpoint, no key), one request per segment."""
+    name = DEEP_TRANSLATOR_BACKEND
+    max_segments = 20
+
+    def translate_batch(self, texts, target, source=None):
+        from deep_translator import GoogleTranslator
+        translator = GoogleTranslator(source=source or 'auto', target=target)
+        return [translator.translate(text) for text in texts]
+
+
+# NLLB language codes for the languages we subtitle in; other codes are passed through as given.
+NLLB_CODES = {
+    "he": "heb_Hebr", "en": "eng_Latn", "ru": "rus_Cyrl", "uk": "ukr_Cyrl", "ar": "arb_Arab", "am": "amh_Ethi",
+    "fr": "fra_Latn", "de": "deu_Latn", "es": "spa_Latn",
+}
+
+
+class LocalMTTranslator(Translator):
+    """
+    MarianMT or NLLB checkpoint from local disk, run in batches in this process. No network, no rate limits;
+    batches run one after another, each using every core.
+    """
+    max_segments = 64
+    max_chars = 20000
+    max_workers = 1
+
+    def __init__(self, model=MT_MODEL, device=MT_DEVICE, batch_size=MT_BATCH_SIZE):
+        if not model:
+            raise ValueError("the local MT engine needs a model directory (SUBS_MT_MODEL)")
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+        # An NLLB checkpoint translates any pair directly; a {source}-{target} path is one Marian model per pair
+        self.pivot = MT_PIVOT if "{source}" in model else None
+        self.name = f"{LOCAL_MT_BACKEND}:{os.path.basename(model.rstrip('/'))}"
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _load(self, source, target):
+        path = self.model.format(source=source, target=target)
+        with self._lock:
+            if path not in self._models:
+                from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+                tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+                model = AutoModelForSeq2SeqLM.from_pretrained(path, local_files_only=True).to(self.device).eval()
+                # NLLB is one multilingual model that needs language codes; Marian is one model per pair
+                nllb = model.config.model_type == "m2m_100"
+                print(f"Loaded translation model {path}")
+                self._models[path] = (tokenizer, model, nllb)
+            return self._models[path]
+
+    def translate_batch(self, texts, target, source=None):
+        if not source:
+            raise ValueError("the local MT engine needs the source language")
+        import torch
+        tokenizer, model, nllb = self._load(source, target)
+        generate_kwargs = {}
+        if nllb:
+            tokenizer.src_lang = NLLB_CODES.get(source, source)
+            generate_kwargs["forced_bos_token_id"] = tokenizer.convert_tokens_to_ids(NLLB_CODES.get(target, target))
+        translated = []
+        for i in range(0, len(texts), self.batch_size):
+            inputs = tokenizer(texts[i:i + self.batch_size], return_tensors="pt", padding=True, truncation=True)
+            with torch.inference_mode():
+                generated = model.generate(**inputs.to(self.device), max_new_tokens=256, **generate_kwargs)
+            translated += tokenizer.batch_decode(generated, skip_special_tokens=True)
+        return translated
+
+
+PROVIDERS = {
+    GOOGLE_V2_BACKEND: GoogleV2Translator,
+    LIBRETRANSLATE_BACKEND: LibreTranslator,
+    LOCAL_MT_BACKEND: LocalMTTranslator,
+    DEEP_TRANSLATOR_BACKEND: DeepTranslatorGoogle,
+}
+_local_translators = {}
+_local_translators_lock = threading.Lock()
+
+
+def get_translator(name=None, api_key=None):
+    """The configured provider (SUBS_TRANSLATOR) unless one is named."""
+    name = name or TRANSLATOR
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown translator {name}, expected one of {', '.join(PROVIDERS)}")
+    if name == GOOGLE_V2_BACKEND:
+        return GoogleV2Translator(api_key)
+    if name == LOCAL_MT_BACKEND:
+        # Keep the loaded models around for the next file/language
+        with _local_translators_lock:
+            if MT_MODEL not in _local_translators:
+                _local_translators[MT_MODEL] = LocalMTTranslator()
+            return _local_translators[MT_MODEL]
+    return PROVIDERS[name]()
+
+
+def translate_texts(texts, target='he', api_key=None, max_workers=None, cache=None, backend=None, source=None,
+                    translator=None, untranslated=None):
+    """
+    Translate a list of segments, preserving order, with the given or configured provider (backend names it).
+    Known segments are served from the translation cache; segments that fail to translate (or are not cached
+    in offline mode) keep the original text, like the per-chunk translation did, and are added to the
+    untranslated set if one is given.
+    """
+    translator = translator or get_translator(backend, api_key=api_key)
+    backend = translator.name
+    max_workers = max_workers or translator.max_workers
+    cache = cache or get_cache()
+    offline = cache.offline if cache else OFFLINE
+    translated = list(texts)
+    unique = list(dict.fromkeys(text for text in texts if text))
+    known = cache.get_many(unique, target, backend) if cache else {}
+    missing = [text for text in unique if text not in known]
+    if cache:
+        print(f"Translation cache ({target}): {len(known)} hits, {len(missing)} misses")
+    if offline and missing:
+        print(f"Offline mode: {len(missing)} segment(s) left untranslated")
+        missing = []
+    batches = pack_batches(missing, max_segments=translator.max_segments, max_chars=translator.max_chars)
+    if batches:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                (batch, pool.submit(translator.translate_batch, [missing[i] for i in batch], target, source))
+                for batch in batches
+            ]
+            fresh = {}
+            for batch, future in futures:
+                try:
+                    for i, text in zip(batch, future.result()):
+                        fresh[missing[i]] = text
+                except Exception as e:
+                    print(f"Translation error: {e}")
+        if cache and fresh:
+            cache.put_many(fresh, target, backend)
+        known.update(fresh)
+    for i, text in enumerate(texts):
+        if text in known:
+            translated[i] = known[text]
+        elif text and untranslated is not None:
+            untranslated.add(text)
+    return translated
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "SUBS_TRANSLATION_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "subs", "translations.sqlite")
+)
+DEFAULT_MAX_MB = float(os.environ.get("SUBS_TRANSLATION_CACHE_MB", "256"))
+# Serve translations only from the cache, never call a translation service.
+OFFLINE = os.environ.get("SUBS_TRANSLATION_OFFLINE", "") not in ("", "0")
+
+# SQLite limits the number of bound parameters per statement.
+_QUERY_CHUNK = 500
+
+
+def _key(text, target, backend):
+    return hashlib.sha1(f"{backend}\0{target}\0{text}".encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """On-disk translation memory keyed by (source text, target language, backend), evicted by least recent use."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_MAX_MB, offline=OFFLINE):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY, backend TEXT, target TEXT, source TEXT, translated TEXT,"
+            " size INTEGER, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self._conn.commit()
+
+    def get_many(self, texts, target, backend):
+        """Return {text: translation} for the texts found in the cache."""
+        keys = {_key(text, target, backend): text for text in set(texts)}
+        found = {}
+        now = time.time()
+        with self._lock:
+            key_list = list(keys)
+            for i in range(0, len(key_list), _QUERY_CHUNK):
+                chunk = key_list[i:i + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, translated FROM translations WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, translated in rows:
+                    found[keys[key]] = translated
+                self._conn.execute(
+                    f"UPDATE translations SET last_used = ? WHERE key IN ({placeholders})", [now] + chunk
+                )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, text, target, backend):
+        return self.get_many([text], target, backend).get(text)
+
+    def put_many(self, translations, target, backend):
+        now = time.time()
+        rows = [
+            (_key(text, target, backend), backend, target, text, translated,
+             len(text.encode("utf-8")) + len(translated.encode("utf-8")), now)
+            for text, translated in translations.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._evict()
+
+    def put(self, text, translated, target, backend):
+        self.put_many({text: translated}, target, backend)
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+        # Drop the oldest entries until we are at 90% of the budget, so we do not evict on every insert.
+        to_free = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM translations ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        self._conn.executemany("DELETE FROM translations WHERE key = ?", stale)
+        self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "size_bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = TranslationCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Translation cache disabled: {e}")
+                _default_cache = False
+        return _default_cache or None
@@ -0,0 +1,138 @@
+import bisect
+
+import numpy as np
+
+from pcm_source import SAMPLE_RATE, PcmSource
+
+FRAME_MS = 30
+# Silence inserted between speech regions in the compacted audio, so Whisper sees a pause there.
+JOIN_GAP_S = 0.3
+# Compacted speech sent to the model at once; only this much of the recording is ever held as float samples
+VAD_WINDOW_S = 120
+# Frames converted to float at a time when measuring energy
+_ENERGY_BLOCK_FRAMES = 2000
+
+
+def frame_energy_db(samples, frame):
+    """Energy in dBFS of every whole frame. int16 input (e.g. a PcmSource map) is converted one block at a time."""
+    n_frames = len(samples) // frame
+    scale = 32768.0 if samples.dtype == np.int16 else 1.0
+    energy = np.empty(n_frames, dtype=np.float32)
+    for first in range(0, n_frames, _ENERGY_BLOCK_FRAMES):
+        last = min(first + _ENERGY_BLOCK_FRAMES, n_frames)
+        block = samples[first * frame:last * frame].astype(np.float32).reshape(last - first, frame) / scale
+        energy[first:last] = np.mean(block * block, axis=1)
+    return 10 * np.log10(energy + 1e-10)
+
+
+def detect_speech(samples, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, threshold_db=12.0, floor_db=-50.0,
+                  min_speech_s=0.25, min_silence_s=0.6, pad_s=0.2):
+    """
+    Energy based voice activity detection. Returns a list of (start, end) speech regions in seconds.
+    A frame counts as speech when its energy is threshold_db above the noise floor (10th percentile of frame
+    energies) and above floor_db dBFS.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    if len(samples) // frame == 0:
+        return []
+    energy_db = frame_energy_db(samples, frame)
+    threshold = max(np.percentile(energy_db, 10) + threshold_db, floor_db)
+    voiced = np.concatenate(([0], (energy_db > threshold).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(voiced))
+    frame_s = frame / sample_rate
+    duration = len(samples) / sample_rate
+    regions = []
+    for start, end in zip(edges[::2] * frame_s, edges[1::2] * frame_s):
+        start, end = max(0.0, start - pad_s), min(duration, end + pad_s)
+        if regions and start - regions[-1][1] < min_silence_s:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return [(start, end) for start, end in regions if end - start >= min_speech_s]
+
+
+def group_regions(regions, max_s=VAD_WINDOW_S):
+    """
+    Split speech regions into runs of at most max_s seconds of compacted speech, each one model input.
+    Runs break in the silence between regions; a single region longer than max_s is a run of its own.
+    """
+    groups = []
+    length = 0.0
+    for start, end in regions:
+        if groups and length + JOIN_GAP_S + end - start <= max_s:
+            groups[-1].append((start, end))
+            length += JOIN_GAP_S + end - start
+        else:
+            groups.append([(start, end)])
+            length = end - start
+    return groups
+
+
+def compact(samples, regions, sample_rate=SAMPLE_RATE):
+    """
+    Concatenate the speech regions. Returns the compacted samples and a timeline of
+    (compact_start, original_start, length) entries used to map timestamps back.
+    """
+    gap = np.zeros(int(JOIN_GAP_S * sample_rate), dtype=samples.dtype)
+    pieces, timeline = [], []
+    position = 0
+    for start, end in regions:
+        piece = samples[int(start * sample_rate):int(end * sample_rate)]
+        timeline.append((position / sample_rate, start, len(piece) / sample_rate))
+        pieces += [piece, gap]
+        position += len(piece) + len(gap)
+    if not pieces:
+        return np.zeros(0, dtype=samples.dtype), timeline
+    return np.concatenate(pieces[:-1]), timeline
+
+
+def to_original_time(t, timeline, is_end=False):
+    if t is None or not timeline:
+        return t
+    starts = [entry[0] for entry in timeline]
+    # An end time exactly on a region boundary belongs to the previous region.
+    i = (bisect.bisect_left(starts, t) if is_end else bisect.bisect_right(starts, t)) - 1
+    compact_start, original_start, length = timeline[max(i, 0)]
+    return original_start + min(max(t - compact_start, 0.0), length)
+
+
+def remap_result(result, timeline):
+    chunks = []
+    for chunk in result['chunks']:
+        start, end = chunk['timestamp']
+        chunks.append({
+            'timestamp': (to_original_time(start, timeline), to_original_time(end, timeline, is_end=True)),
+            'text': chunk['text'],
+        })
+    return {'text': result.get('text', ''), 'chunks': chunks}
+
+
+def prepare_speech(audio_path):
+    """The speech regions of a WAV grouped into model inputs (see group_regions); [] when there is no speech."""
+    with PcmSource(audio_path) as source:
+        # Detection works on the int16 map, a block at a time
+        regions = detect_speech(source.samples)
+        speech = sum(end - start for start, end in regions)
+        print(f"VAD: {speech:.0f}s of speech in {source.duration:.0f}s of audio ({len(regions)} regions)")
+    return group_regions(regions)
+
+
+def load_speech(audio_path, regions):
+    """(pipeline input, timeline) for one group of regions, compacted from the map and only then made float."""
+    with PcmSource(audio_path) as source:
+        compacted, timeline = compact(source.samples, regions)
+    return {"raw": compacted.astype(np.float32) / 32768.0, "sampling_rate": SAMPLE_RATE}, timeline
+
+
+def merge_results(results):
+    """One result from the remapped results of a file's groups, in order."""
+    chunks = [chunk for result in results for chunk in result['chunks']]
+    return {'text': ''.join(result.get('text', '') for result in results), 'chunks': chunks}
+
+
+def transcribe_speech_only(asr, audio_path):
+    results = []
+    for regions in prepare_speech(audio_path):
+        asr_input, timeline = load_speech(audio_path, regions)
+        results.append(remap_result(asr(asr_input, return_timestamps=True), timeline))
+    return merge_results(results)
@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+import time
+
+
+def input_identity(video_path):
+    stat = os.stat(video_path)
+    return {"path": os.path.abspath(video_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+class WorkDir:
+    """
+    Persistent per-job directory with a manifest of finished stages.
+    The directory name is derived from the input file and the settings that change the results,
+    so re-running the same job lands in the same directory and skips every stage that is already done.
+    """
+
+    def __init__(self, root, video_path, **settings):
+        identity = input_identity(video_path)
+        digest = hashlib.sha256(json.dumps([identity, settings], sort_keys=True, default=str).encode()).hexdigest()
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        self.path = os.path.join(root, f"{stem}-{digest[:16]}")
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            print(f"Resuming work directory: {self.path}")
+        else:
+            self.manifest = {"input": identity, "settings": settings, "stages": {}}
+            self._save()
+
+    def done(self, stage):
+        """A stage counts as done only if it was marked and all files it recorded still exist."""
+        entry = self.manifest["stages"].get(stage)
+        return bool(entry) and all(os.path.exists(path) for path in entry.get("files", []))
+
+    def mark(self, stage, files=(), **info):
+        self.manifest["stages"][stage] = {"finished": time.time(), "files": list(files), **info}
+        self._save()
+
+    def _save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)